@@ -1,6 +1,9 @@
 from flask import Flask
 from flask_cors import CORS
-from community_routes import community_bp
+from community_routes import community_bp, driver, forget_community, NODE_LABEL_COMMUNITY
+from schema import bootstrap_schema
+from outbox import start_dispatcher
+from deletion_jobs import start_worker
 import os
 from dotenv import load_dotenv
 
@@ -17,8 +20,18 @@ CORS(app,
      origins=[FRONTEND_URL],
      methods=["GET", "POST", "OPTIONS"],
      allow_headers=["Content-Type", "Authorization"],
+     expose_headers=["X-Total-Count", "X-Next-Cursor"],
      supports_credentials=True)
 
+# 🗂️ Create constraints and indexes, then check that hot queries use them
+bootstrap_schema(driver)
+
+# 📤 Deliver queued notifications in the background
+start_dispatcher(driver)
+
+# 🧹 Delete communities in bounded batches, resuming jobs left unfinished by a restart
+start_worker(driver, NODE_LABEL_COMMUNITY, forget_community)
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5002))
     app.run(port=port, host="0.0.0.0")
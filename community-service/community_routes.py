@@ -1,9 +1,20 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context, g
 from neo4j import GraphDatabase
+from neo4j.exceptions import ConstraintError
 import os
-import jwt
-import requests
+import re
+import json
+import base64
+import time
 from dotenv import load_dotenv
+from cache import LRUCache, VersionCounter
+from hierarchy import ParentIndex, edge_error, validate_edges
+from tree_layout import compute_layout
+from etags import version_etag, not_modified, with_etag
+import outbox
+import deletion_jobs
+from http_client import upstream_stats
+from auth_utils import require_auth, token_cache
 
 load_dotenv()
 
@@ -16,75 +27,264 @@ NODE_LABEL_USER = "communityservice_usernode"
 NODE_LABEL_COMMUNITY = "communityservice_community"
 
 community_bp = Blueprint("community", __name__)
-SECRET_KEY = os.getenv("SECRET_KEY")
 
 
 driver = GraphDatabase.driver(
     os.getenv("NEO4J_URI"),
     auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD"))
 )
+
+# 🌳 Cached /leader-node-and-tree payloads, invalidated by bumping the community's version
+tree_cache = LRUCache(
+    max_entries=int(os.getenv("TREE_CACHE_SIZE", 256)),
+    ttl=int(os.getenv("TREE_CACHE_TTL", 300)),
+)
+# Server-side tree layouts, cached per tree version alongside the trees themselves
+layout_cache = LRUCache(
+    max_entries=int(os.getenv("TREE_CACHE_SIZE", 256)),
+    ttl=int(os.getenv("TREE_CACHE_TTL", 300)),
+)
+tree_versions = VersionCounter()
+member_versions = VersionCounter()
+profile_versions = VersionCounter()
+
+# 👤 Public profile fields shown in the tree's profile modal
+PROFILE_FIELDS = (
+    "name", "public_email", "dob", "age", "phone", "gender", "location",
+    "bio", "linkedin", "github", "twitter", "website",
+)
+PROFILE_PROJECTION = "u {" + ", ".join(f".{field}" for field in PROFILE_FIELDS) + "}"
+MAX_BATCH_PROFILES = 100
+
+# Short-lived per-username profiles shared by /user-details, /get-user-details and /users-details
+profile_cache = LRUCache(
+    max_entries=int(os.getenv("PROFILE_CACHE_SIZE", 5000)),
+    ttl=int(os.getenv("PROFILE_CACHE_TTL", 30)),
+)
+
+
+def invalidate_profile(username):
+    profile_versions.bump(username)
+    profile_cache.pop(username)
+
+
+def fetch_profiles(usernames):
+    """Return {username: profile} for the users that exist, reading only cache misses from Neo4j."""
+    profiles = {}
+    missing = []
+    for username in dict.fromkeys(usernames):
+        profile = profile_cache.get(username)
+        if profile is None:
+            missing.append(username)
+        else:
+            profiles[username] = profile
+    if missing:
+        with driver.session() as session:
+            result = session.run(
+                f"""
+                UNWIND $usernames AS username
+                MATCH (u:{NODE_LABEL_USER} {{username: username}})
+                RETURN u.username AS username, {PROFILE_PROJECTION} AS profile
+                """,
+                usernames=missing
+            )
+            for record in result:
+                profile = {field: record["profile"].get(field) for field in PROFILE_FIELDS}
+                profile_cache.set(record["username"], profile)
+                profiles[record["username"]] = profile
+    return profiles
+
+
+def invalidate_tree(community_name):
+    tree_versions.bump(community_name)
+    tree_cache.pop(community_name)
+    layout_cache.pop(community_name)
+
+
+def invalidate_members(community_name):
+    member_versions.bump(community_name)
+
+
+def forget_community(community_name):
+    """Drop everything cached about a community that is being or has been deleted."""
+    parent_index.drop(community_name)
+    invalidate_tree(community_name)
+    invalidate_members(community_name)
+
+
+def load_parent_edges(community_name):
+    with driver.session() as session:
+        result = session.run(
+            f"""
+            MATCH (u:{NODE_LABEL_USER})-[:CHILD_OF {{community: $community_name}}]->(v:{NODE_LABEL_USER})
+            RETURN u.username AS child, v.username AS parent
+            """,
+            community_name=community_name
+        )
+        return [(record["child"], record["parent"]) for record in result]
+
+
+# child -> parent pointers per community, used to reject cycles and second parents
+parent_index = ParentIndex(load_parent_edges, max_communities=int(os.getenv("TREE_CACHE_SIZE", 256)))
+
+# Bounds for the lazy-expansion tree endpoints
+MAX_TREE_DEPTH = int(os.getenv("MAX_TREE_DEPTH", 100))
+MAX_SUBTREE_NODES = int(os.getenv("MAX_SUBTREE_NODES", 2000))
+MAX_PAGE_SIZE = 200
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", 500))
+MAX_BATCH_JOIN_RESPONSES = 500
+
+
+COMMUNITY_NAME_FULLTEXT_INDEX = "communityservice_community_name_ft"
+
+# Recompute the maintained member/pending counters from the edges themselves
+REPAIR_COUNTERS_QUERY = f"""
+MATCH (c:{NODE_LABEL_COMMUNITY})
+WHERE $community_name IS NULL OR c.name = $community_name
+CALL {{
+    WITH c
+    SET c.member_count = COUNT {{ (:{NODE_LABEL_USER})-[:MEMBER_OF]->(c) }},
+        c.pending_count = COUNT {{ (:{NODE_LABEL_USER})-[:REQUESTED]->(c) }}
+}} IN TRANSACTIONS OF 500 ROWS
+"""
+
+# Live communities: the count store total minus the few being deleted, found through their index
+COMMUNITY_TOTAL_QUERY = f"""
+CALL {{ MATCH (c:{NODE_LABEL_COMMUNITY}) RETURN count(c) AS communities }}
+CALL {{ MATCH (c:{NODE_LABEL_COMMUNITY}) WHERE c.deleting IS NOT NULL RETURN count(c) AS deleting }}
+RETURN communities - deleting AS total
+"""
+
+
+def browse_query(after):
+    """One page of communities by name; the name predicate lets the index serve range and order."""
+    return f"""
+    MATCH (c:{NODE_LABEL_COMMUNITY})
+    WHERE {"c.name > $after_name" if after else "c.name IS NOT NULL"} AND c.deleting IS NULL
+    WITH c ORDER BY c.name
+    LIMIT $limit
+    MATCH (c)<-[:CREATED]-(u:{NODE_LABEL_USER})
+    RETURN
+        c.name AS name,
+        c.level AS level,
+        c.motto AS motto,
+        c.max_size AS max_size,
+        coalesce(c.member_count, 0) AS member_count,
+        u.name AS creator,
+        EXISTS {{ MATCH (:{NODE_LABEL_USER} {{email: $current_user}})-[:MEMBER_OF]->(c) }} AS is_member,
+        u.email = $current_user AS is_creator,
+        null AS score
+    ORDER BY c.name
+    """
+
+
+LUCENE_SPECIAL_CHARS = re.compile(r'([+\-&|!(){}\[\]^"~*?:\\/])')
+
+
+def fulltext_query(search):
+    """Turn free text into a Lucene query matching every word as a prefix."""
+    terms = [LUCENE_SPECIAL_CHARS.sub(r"\\\1", term) for term in search.lower().split()]
+    return " AND ".join(f"{term}*" for term in terms)
+
+
+def wants_ndjson():
+    return (request.args.get("format") == "ndjson"
+            or request.accept_mimetypes.best == "application/x-ndjson")
+
+
+def page_args():
+    """Return (after, limit) for keyset pagination; limit is None when not requested."""
+    after = request.args.get("after")
+    limit = int_arg("limit", MAX_PAGE_SIZE, 1, MAX_PAGE_SIZE) if "limit" in request.args else None
+    return after, limit
+
+
+def stream_ndjson(queries):
+    """Stream (query, params) results as NDJSON straight from the Neo4j result iterators."""
+    def generate():
+        with driver.session() as session:
+            for query, params in queries:
+                for record in session.run(query, **params):
+                    yield json.dumps(record.data(), default=str) + "\n"
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+def paged_response(body, items, limit, cursor_key):
+    """jsonify `body`, trimming the extra probe row and setting X-Next-Cursor if there is more."""
+    next_cursor = None
+    if limit is not None and len(items) > limit:
+        del items[limit:]
+        next_cursor = items[-1][cursor_key]
+    response = jsonify(body)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+
+def int_arg(name, default, minimum, maximum):
+    """Read an integer query parameter, clamped to [minimum, maximum]."""
+    try:
+        value = int(request.args.get(name, default))
+    except (TypeError, ValueError):
+        value = default
+    return max(minimum, min(value, maximum))
+
+
+def encode_cursor(*keys):
+    return base64.urlsafe_b64encode(json.dumps(keys).encode()).decode()
+
+
+def decode_cursor(cursor, types):
+    """Return the sort keys packed in an X-Next-Cursor value, or None if they don't match `types`."""
+    try:
+        keys = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(keys, list) or len(keys) != len(types):
+        return None
+    if not all(isinstance(key, kind) for key, kind in zip(keys, types)):
+        return None
+    return keys
+
 # 🔍 Get user details
 @community_bp.route("/user-details", methods=["GET", "OPTIONS"])
+@require_auth
 def get_user_details():
     if request.method == "OPTIONS":
         return jsonify({"status": "ok"}), 200
 
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized"}), 401
-    token = auth_header.split(" ")[1]
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        email = payload.get("email")
-        username = payload.get("username")
-    except jwt.InvalidTokenError:
-        return jsonify({"error": "Invalid token"}), 401
+    payload = g.jwt_payload
+    email = payload.get("email")
+    username = payload.get("username")
 
+    # Looked up by email: the token's username can be days stale and since taken by someone else
     with driver.session() as session:
         result = session.run(
             f"""
             MERGE (u:{NODE_LABEL_USER} {{email: $email}})
             ON CREATE SET u.public_email = $email
             ON CREATE SET u.username = $username
-            RETURN u
+            RETURN u.username AS username, {PROFILE_PROJECTION} AS profile
             """,
             email=email,
             username=username,
         )
 
         record = result.single()
-        user_node = record["u"]
-        user_data = {
-            "name": user_node.get("name"),
-            "public_email": user_node.get("public_email"),
-            "dob": user_node.get("dob"),
-            "age": user_node.get("age"),
-            "phone": user_node.get("phone"),
-            "gender": user_node.get("gender"),
-            "location": user_node.get("location"),
-            "bio": user_node.get("bio"),
-            "linkedin": user_node.get("linkedin"),
-            "github": user_node.get("github"),
-            "twitter": user_node.get("twitter"),
-            "website": user_node.get("website"),
-        }
+        user_data = {field: record["profile"].get(field) for field in PROFILE_FIELDS}
+        if record["username"]:
+            profile_cache.set(record["username"], user_data)
         return jsonify(user_data), 200
 
 # ✏️ Update user details
 @community_bp.route("/update-user", methods=["POST", "OPTIONS"])
+@require_auth
 def update_user():
     if request.method == "OPTIONS":
         return jsonify({"status": "ok"}), 200
 
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized"}), 401
-    token = auth_header.split(" ")[1]
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        email = payload.get("email")
-    except jwt.InvalidTokenError:
-        return jsonify({"error": "Invalid token"}), 401
+    payload = g.jwt_payload
+    email = payload.get("email")
 
     data = request.json
     if "email" in data:
@@ -101,29 +301,35 @@ def update_user():
     """
     if new_public_email:
         query += "\nSET u.public_email = $public_email"
-    query += "\nRETURN u"
+    # Names are shown in trees and member lists, so report where this user appears
+    query += f"""
+    WITH u
+    OPTIONAL MATCH (u)-[r:CHILD_OF]-()
+    OPTIONAL MATCH (u)-[:CREATED|MEMBER_OF]->(c:{NODE_LABEL_COMMUNITY})
+    RETURN u.username AS username,
+           collect(DISTINCT r.community) + collect(DISTINCT c.name) AS communities
+    """
 
     with driver.session() as session:
         try:
-            session.run(query, email=email, data=data, public_email=new_public_email)
+            record = session.run(query, email=email, data=data, public_email=new_public_email).single()
+            if record and record["username"]:
+                invalidate_profile(record["username"])
+            for community_name in set(record["communities"] if record else []):
+                invalidate_tree(community_name)
+                invalidate_members(community_name)
             return jsonify({"message": "Profile updated successfully"}), 200
         except Exception as e:
             return jsonify({"error": str(e)}), 500
         
 @community_bp.route("/register", methods=["POST", "OPTIONS"])
+@require_auth
 def register_community():
     if request.method == "OPTIONS":
         return jsonify({"status": "ok"}), 200
 
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized"}), 401
-    token = auth_header.split(" ")[1]
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        creator_email = payload.get("email")
-    except jwt.InvalidTokenError:
-        return jsonify({"error": "Invalid token"}), 401
+    payload = g.jwt_payload
+    creator_email = payload.get("email")
 
     data = request.json
     name = data.get("name")
@@ -154,6 +360,8 @@ def register_community():
                     level: $level,
                     motto: $motto,
                     max_size: $max_size,
+                    member_count: 0,
+                    pending_count: 0,
                     created_at: datetime()
                 }})
                 MERGE (u)-[:CREATED]->(c)
@@ -161,171 +369,178 @@ def register_community():
 
 
             return jsonify({"message": "Community registered successfully"}), 201
+        except ConstraintError:
+            return jsonify({"error": "Community name already taken"}), 409
         except Exception as e:
             return jsonify({"error": str(e)}), 500
         
 @community_bp.route("/search", methods=["GET", "OPTIONS"])
+@require_auth
 def search_communities():
     if request.method == "OPTIONS":
         return jsonify({"status": "ok"}), 200
 
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized"}), 401
-    token = auth_header.split(" ")[1]
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        current_user = payload.get("email")
-    except jwt.InvalidTokenError:
-        return jsonify({"error": "Invalid token"}), 401
+    payload = g.jwt_payload
+    current_user = payload.get("email")
 
-    search = request.args.get("q", "").lower()
+    search = request.args.get("q", "").strip()
+    limit = int_arg("limit", 20, 1, MAX_PAGE_SIZE)
+    # Keyset cursor: (score, name) of the last full-text hit, or the last name when browsing
+    after = None
+    if request.args.get("cursor"):
+        after = decode_cursor(request.args["cursor"], ((int, float), str) if search else (str,))
+        if after is None:
+            return jsonify({"error": "Invalid cursor"}), 400
 
     with driver.session() as session:
-        result = session.run(f"""
-            MATCH (c:{NODE_LABEL_COMMUNITY})<-[:CREATED]-(u:{NODE_LABEL_USER})
-            WHERE toLower(c.name) CONTAINS $search
-            OPTIONAL MATCH (u2:{NODE_LABEL_USER} {{email: $current_user}})
-            OPTIONAL MATCH (u2)-[:MEMBER_OF]->(c)
-            RETURN 
-                c.name AS name,
-                c.level AS level,
-                c.motto AS motto,
-                u.name AS creator,
-                EXISTS((u2)-[:MEMBER_OF]->(c)) AS is_member,
-                u.email = $current_user AS is_creator
-            ORDER BY c.name
-        """, search=search, current_user=current_user)
-
-        communities = []
-        for record in result:
-            communities.append({
-                "name": record["name"],
-                "level": record["level"],
-                "motto": record["motto"],
-                "creator": record["creator"],
-                "canJoin": not (record["is_member"] or record["is_creator"])
-            })
+        if search:
+            # Ranked lookup through the full-text index; only the page is joined to creators
+            query = fulltext_query(search)
+            total = session.run(
+                """
+                CALL db.index.fulltext.queryNodes($index, $query) YIELD node
+                WHERE node.deleting IS NULL
+                RETURN count(node) AS total
+                """,
+                index=COMMUNITY_NAME_FULLTEXT_INDEX, query=query
+            ).single()["total"]
+            result = session.run(f"""
+                CALL db.index.fulltext.queryNodes($index, $query) YIELD node AS c, score
+                WHERE c.deleting IS NULL
+                  AND ($after_score IS NULL OR score < $after_score
+                       OR (score = $after_score AND c.name > $after_name))
+                WITH c, score ORDER BY score DESC, c.name
+                LIMIT $limit
+                MATCH (c)<-[:CREATED]-(u:{NODE_LABEL_USER})
+                RETURN
+                    c.name AS name,
+                    c.level AS level,
+                    c.motto AS motto,
+                    c.max_size AS max_size,
+                    coalesce(c.member_count, 0) AS member_count,
+                    u.name AS creator,
+                    EXISTS {{ MATCH (:{NODE_LABEL_USER} {{email: $current_user}})-[:MEMBER_OF]->(c) }} AS is_member,
+                    u.email = $current_user AS is_creator,
+                    score
+                ORDER BY score DESC, c.name
+            """, index=COMMUNITY_NAME_FULLTEXT_INDEX, query=query,
+                after_score=after[0] if after else None, after_name=after[1] if after else None,
+                limit=limit + 1, current_user=current_user)
+        else:
+            total = session.run(COMMUNITY_TOTAL_QUERY).single()["total"]
+            result = session.run(
+                browse_query(after),
+                after_name=after[0] if after else None, limit=limit + 1, current_user=current_user
+            )
+
+        records = list(result)
+
+    communities = []
+    for record in records[:limit]:
+        communities.append({
+            "name": record["name"],
+            "level": record["level"],
+            "motto": record["motto"],
+            "max_size": record["max_size"],
+            "member_count": record["member_count"],
+            "creator": record["creator"],
+            "canJoin": not (record["is_member"] or record["is_creator"])
+        })
 
-        return jsonify(communities), 200
+    # The body stays a plain list; paging metadata travels in headers
+    response = jsonify(communities)
+    response.headers["X-Total-Count"] = str(total)
+    if len(records) > limit:
+        last = records[limit - 1]
+        keys = (last["score"], last["name"]) if search else (last["name"],)
+        response.headers["X-Next-Cursor"] = encode_cursor(*keys)
+    return response, 200
     
 @community_bp.route("/join", methods=["POST", "OPTIONS"])
+@require_auth
 def request_join():
     if request.method == "OPTIONS":
         return jsonify({"status": "ok"}), 200
 
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized"}), 401
-    token = auth_header.split(" ")[1]
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        user_email = payload["email"]
-        username = payload["username"]
-    except jwt.InvalidTokenError:
-        return jsonify({"error": "Invalid token"}), 401
+    payload = g.jwt_payload
+    user_email = payload["email"]
+    username = payload["username"]
 
     data = request.json
     community_name = data.get("community")
     if not community_name:
         return jsonify({"error": "Community name is required"}), 400
 
+    notify_creator = outbox.enqueue_clause(
+        "notify",
+        to="creator.email",
+        message="coalesce(u.name, 'Unknown Person') + \" requested to join your community '\" + $name + \"'\"",
+        type="'join_request'",
+        community="$name",
+        requester_email="u.email",
+        request_id="req.id"
+    )
+
+    def request_join_tx(tx):
+        # Check, create the request and queue the creator's notification in one round trip
+        result = tx.run(f"""
+            MATCH (c:{NODE_LABEL_COMMUNITY} {{name: $name}})<-[:CREATED]-(creator:{NODE_LABEL_USER})
+            WHERE c.deleting IS NULL
+            MERGE (u:{NODE_LABEL_USER} {{email: $email}})
+            // Take the user's write lock before checking so concurrent joins serialize
+            SET u._lock = true
+            REMOVE u._lock
+            WITH c, creator, u,
+                 EXISTS {{ (u)-[:REQUESTED]->(c) }} AS already_requested,
+                 EXISTS {{ (u)-[:MEMBER_OF]->(c) }} AS already_member,
+                 creator.email = $email AS is_creator,
+                 coalesce(c.max_size, -1) >= 0 AND coalesce(c.member_count, 0) >= c.max_size AS is_full
+            CALL {{
+                WITH c, creator, u, already_requested, already_member, is_creator, is_full
+                WITH * WHERE NOT (already_requested OR already_member OR is_creator OR is_full)
+                CREATE (u)-[req:REQUESTED {{id: randomUUID()}}]->(c)
+                SET c.pending_count = coalesce(c.pending_count, 0) + 1
+                {notify_creator}
+            }}
+            RETURN already_requested, already_member, is_creator, is_full
+        """, email=user_email, name=community_name,
+            sender_email=user_email, sender_username=username)
+        record = result.single()
+        return record.data() if record else None
+
     try:
         with driver.session() as session:
-            # Step 1: Check all conditions and get creator email
-            result = session.run(f"""
-                MATCH (c:{NODE_LABEL_COMMUNITY} {{name: $name}})<-[:CREATED]-(creator:{NODE_LABEL_USER})
-                OPTIONAL MATCH (u:{NODE_LABEL_USER} {{email: $email}})-[:REQUESTED]->(c)
-                OPTIONAL MATCH (u)-[m:MEMBER_OF]->(c)
-                RETURN 
-                    creator.email AS creator_email,
-                    u IS NOT NULL AND EXISTS((u)-[:REQUESTED]->(c)) AS already_requested,
-                    m IS NOT NULL AS already_member,
-                    creator.email = $email AS is_creator
-            """, name=community_name, email=user_email)
-
-            record = result.single()
-            if not record:
-                return jsonify({"error": "Community not found"}), 404
-
-            if record["already_requested"]:
-                return jsonify({"error": "Already requested to join"}), 400
-            if record["already_member"]:
-                return jsonify({"error": "Already a member"}), 400
-            if record["is_creator"]:
-                return jsonify({"error": "You are the creator"}), 400
-
-            creator_email = record["creator_email"]
-
-            # Step 2: Create request relationship
-            session.run(f"""
-                MERGE (u:{NODE_LABEL_USER} {{email: $email}})
-                MERGE (c:{NODE_LABEL_COMMUNITY} {{name: $name}})
-                MERGE (u)-[:REQUESTED]->(c)
-            """, email=user_email, name=community_name)
-
-            # Step 3: Fetch user's name for message
-            name_result = session.run(f"""
-                MATCH (u:{NODE_LABEL_USER} {{email: $email}})
-                RETURN u.name AS name
-            """, email=user_email)
-
-            name_record = name_result.single()
-            full_name = name_record["name"] if name_record and name_record["name"] else "Unknown Person"
-
-        # Step 4: Notify the creator
-        message = f"{full_name} requested to join your community '{community_name}'"
-        response = requests.post(NOTIFY_URL + "/api/notify/", json={
-            "to": creator_email,
-            "message": message,
-            "type": "join_request"
-        }, headers={"Authorization": f"Bearer {token}"})
-
-        if response.status_code != 201:
-            print("Notification failed:", response.text)
-            # Rollback request edge if notify fails
-            with driver.session() as session:
-                session.run(f"""
-                    MATCH (u:{NODE_LABEL_USER} {{email: $email}})-[r:REQUESTED]->(c:{NODE_LABEL_COMMUNITY} {{name: $name}})
-                    DELETE r
-                """, email=user_email, name=community_name)
-
-            return jsonify({"error": "Failed to notify the creator"}), 500
+            record = session.execute_write(request_join_tx)
 
+        if not record:
+            return jsonify({"error": "Community not found"}), 404
+        if record["already_requested"]:
+            return jsonify({"error": "Already requested to join"}), 400
+        if record["already_member"]:
+            return jsonify({"error": "Already a member"}), 400
+        if record["is_creator"]:
+            return jsonify({"error": "You are the creator"}), 400
+        if record["is_full"]:
+            return jsonify({"error": "Community is full"}), 409
+
+        outbox.wake()
         return jsonify({"message": "Join request sent"}), 200
 
     except Exception as e:
-        # Rollback on any exception
-        try:
-            with driver.session() as session:
-                session.run(f"""
-                    MATCH (u:{NODE_LABEL_USER} {{email: $email}})-[r:REQUESTED]->(c:{NODE_LABEL_COMMUNITY} {{name: $name}})
-                    DELETE r
-                """, email=user_email, name=community_name)
-        except:
-            pass
-
         return jsonify({"error": f"Request failed: {str(e)}"}), 500
 
 
     
 
 @community_bp.route("/join-response", methods=["POST", "OPTIONS"])
+@require_auth
 def handle_join_response():
     print("⚠️ join-response route hit")  # <- Add this at the very top
     if request.method == "OPTIONS":
         return jsonify({"status": "ok"}), 200
 
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized"}), 401
-    token = auth_header.split(" ")[1]
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        creator_email = payload.get("email")
-    except jwt.InvalidTokenError:
-        print("failed")
-        return jsonify({"error": "Invalid token"}), 401
+    payload = g.jwt_payload
+    creator_email = payload.get("email")
 
     data = request.json
     requester = data.get("requester")   # username of the user who requested
@@ -343,90 +558,185 @@ def handle_join_response():
         return jsonify({"error": "Missing or invalid data"}), 400
     
 
+    # Both notifications are queued in the same transaction as the membership change
+    notify_requester = outbox.enqueue_clause(
+        "notify",
+        to="r.email",
+        message="\"Your request to join '\" + $community + \"' was \" + $outcome",
+        type="'system'",
+        community="$community"
+    )
+    mark_handled = outbox.enqueue_clause(
+        "mark_handled",
+        requester="$requester",
+        community="$community",
+        decision="$decision",
+        requester_email="r.email",
+        request_id="request_id"
+    )
     with driver.session() as session:
-        if decision == "accept":
-            session.run(f"""
-                MATCH (c:{NODE_LABEL_COMMUNITY} {{name: $community}})
-                MATCH (r:{NODE_LABEL_USER} {{email: $requester_email}})-[req:REQUESTED]->(c)
-                DELETE req
-                MERGE (r)-[:MEMBER_OF]->(c)
-            """, community=community, requester_email=requester_email)
-        else:
-            session.run(f"""
-                MATCH (c:{NODE_LABEL_COMMUNITY} {{name: $community}})
-                MATCH (r:{NODE_LABEL_USER} {{email: $requester_email}})-[req:REQUESTED]->(c)
+        record = session.run(f"""
+            MATCH (c:{NODE_LABEL_COMMUNITY} {{name: $community}})
+            MATCH (r:{NODE_LABEL_USER} {{email: $requester_email}})-[req:REQUESTED]->(c)
+            // Take the community's write lock before reading its counters so concurrent accepts serialize
+            SET c._lock = true
+            REMOVE c._lock
+            WITH c, r, req, req.id AS request_id,
+                 $decision = 'accept' AND coalesce(c.max_size, -1) >= 0
+                 AND coalesce(c.member_count, 0) >= c.max_size AS is_full
+            CALL {{
+                WITH c, r, req, request_id, is_full
+                WITH * WHERE NOT is_full
                 DELETE req
-            """, community=community, requester_email=requester_email)
+                SET c.pending_count = coalesce(c.pending_count, 1) - 1
+                FOREACH (_ IN CASE WHEN $decision = 'accept' THEN [1] ELSE [] END |
+                    MERGE (r)-[:MEMBER_OF]->(c)
+                    SET c.member_count = coalesce(c.member_count, 0) + 1
+                )
+                {notify_requester}
+                {mark_handled}
+            }}
+            RETURN is_full
+        """, community=community, requester_email=requester_email, requester=requester,
+            decision=decision, outcome="accepted" if decision == "accept" else "rejected",
+            sender_email=creator_email, sender_username=payload.get("username")).single()
+    if record and record["is_full"]:
+        return jsonify({"error": "Community is full"}), 409
+    invalidate_members(community)
+    outbox.wake()
 
-    # ✅ Send final notification to the requester
-    message = f"Your request to join '{community}' was {'accepted' if decision == 'accept' else 'rejected'}"
-    try:
-        requests.post(
-            NOTIFY_URL + "/api/notify",
-            json={
-                "to": requester_email,
-                "message": message,
-                "type": "system"
-            },
-            headers={"Authorization": f"Bearer {token}"}
-        )
-    except Exception as e:
-        print("Failed to notify user:", e)
+    return jsonify({"message": f"User {decision}ed successfully"}), 200
 
-    try:
-        requests.post(
-            NOTIFY_URL + "/api/notify/mark-handled",
-            json={
-                "requester": requester,
-                "community": community,
-                "decision": decision
-            },
-            headers={"Authorization": f"Bearer {token}"}
-        )
-    except Exception as e:
-        print("Failed to update original notification:", e)
 
-    return jsonify({"message": f"User {decision}ed successfully"}), 200
+@community_bp.route("/join-response/batch", methods=["POST", "OPTIONS"])
+@require_auth
+def handle_join_responses_batch():
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+
+    payload = g.jwt_payload
+    creator_email = payload.get("email")
+
+    data = request.json or {}
+    community = data.get("community")
+    decision = data.get("decision")
+    requester_emails = data.get("requester_emails")
+    if not community or decision not in ("accept", "reject") or not isinstance(requester_emails, list):
+        return jsonify({"error": "Missing or invalid data"}), 400
+    if not all(isinstance(email, str) for email in requester_emails):
+        return jsonify({"error": "requester_emails must be a list of strings"}), 400
+    if len(requester_emails) > MAX_BATCH_JOIN_RESPONSES:
+        return jsonify({"error": f"At most {MAX_BATCH_JOIN_RESPONSES} requests per batch"}), 400
+
+    notify_requester = outbox.enqueue_clause(
+        "notify",
+        to="r.email",
+        message="\"Your request to join '\" + $community + \"' was \" + $outcome",
+        type="'system'",
+        community="$community"
+    )
+    mark_handled = outbox.enqueue_clause(
+        "mark_handled",
+        requester="r.username",
+        community="$community",
+        decision="$decision",
+        requester_email="r.email",
+        request_id="request_id"
+    )
+
+    def join_responses_tx(tx):
+        # Every pending request is resolved and its notifications queued in one transaction
+        result = tx.run(f"""
+            MATCH (c:{NODE_LABEL_COMMUNITY} {{name: $community}})<-[:CREATED]-(leader:{NODE_LABEL_USER})
+            // Take the community's write lock before reading its counters so concurrent accepts serialize
+            SET c._lock = true
+            REMOVE c._lock
+            WITH c, leader.email = $creator_email AS is_leader,
+                 CASE
+                     WHEN $decision = 'reject' OR coalesce(c.max_size, -1) < 0 THEN size($requester_emails)
+                     WHEN c.max_size - coalesce(c.member_count, 0) < 0 THEN 0
+                     ELSE c.max_size - coalesce(c.member_count, 0)
+                 END AS capacity
+            CALL {{
+                WITH c, is_leader, capacity
+                WITH c, capacity WHERE is_leader
+                UNWIND $requester_emails AS requester_email
+                MATCH (r:{NODE_LABEL_USER} {{email: requester_email}})-[req:REQUESTED]->(c)
+                // Accept only as many as there are free seats; the rest stay pending
+                WITH c, capacity, collect([r, req]) AS pairs
+                WITH c, pairs[0..capacity] AS chosen
+                UNWIND chosen AS pair
+                WITH c, pair[0] AS r, pair[1] AS req, pair[1].id AS request_id
+                DELETE req
+                FOREACH (_ IN CASE WHEN $decision = 'accept' THEN [1] ELSE [] END |
+                    MERGE (r)-[:MEMBER_OF]->(c)
+                )
+                {notify_requester}
+                {mark_handled}
+                RETURN collect(r.email) AS handled
+            }}
+            SET c.pending_count = coalesce(c.pending_count, size(handled)) - size(handled),
+                c.member_count = coalesce(c.member_count, 0)
+                    + CASE WHEN $decision = 'accept' THEN size(handled) ELSE 0 END
+            RETURN is_leader, handled
+        """, community=community, creator_email=creator_email,
+            requester_emails=list(dict.fromkeys(requester_emails)),
+            decision=decision, outcome="accepted" if decision == "accept" else "rejected",
+            sender_email=creator_email, sender_username=payload.get("username"))
+        record = result.single()
+        return record.data() if record else None
+
+    with driver.session() as session:
+        record = session.execute_write(join_responses_tx)
+    if not record:
+        return jsonify({"error": "Community not found"}), 404
+    if not record["is_leader"]:
+        return jsonify({"error": "Only the community leader can respond to requests"}), 403
+
+    invalidate_members(community)
+    outbox.wake()
+    handled = set(record["handled"])
+    return jsonify({
+        "message": f"{len(handled)} request(s) {decision}ed",
+        "handled": sorted(handled),
+        "not_handled": [email for email in requester_emails if email not in handled]
+    }), 200
 
 
 @community_bp.route("/my-communities", methods=["GET", "OPTIONS"])
+@require_auth
 def get_my_communities():
     print("⚠️ join-response route hit", flush=True)  # <- Add this at the very top
     if request.method == "OPTIONS":
         return jsonify({"status": "ok"}), 200
 
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Missing token"}), 401
-    try:
-        token = auth_header.split(" ")[1]
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-    except Exception:
-        return jsonify({"error": "Invalid token"}), 401
+    payload = g.jwt_payload
     username = payload.get("username")
     if not username:
         return jsonify({"error": "User not found in token"}), 401
+    after, limit = page_args()
     query = f"""
     MATCH (u:{NODE_LABEL_USER} {{username: $username}})-[:CREATED|MEMBER_OF]->(c:{NODE_LABEL_COMMUNITY})
     WITH DISTINCT c
+    WHERE c.deleting IS NULL AND ($after IS NULL OR c.name > $after)
+    WITH c ORDER BY c.name
+    {"LIMIT $limit" if limit is not None else ""}
     OPTIONAL MATCH (leader:{NODE_LABEL_USER})-[:CREATED]->(c)
-    RETURN c, leader.username AS leader_username, leader.name AS leader
+    RETURN c.name AS name, c.level AS level, c.motto AS motto,
+           c.max_size AS max_size,
+           coalesce(c.member_count, 0) AS member_count,
+           coalesce(c.pending_count, 0) AS pending_count,
+           leader.username AS leader_username, leader.name AS leader
+    ORDER BY name
     """
+    params = {"username": username, "after": after, "limit": limit + 1 if limit else None}
+    if wants_ndjson():
+        params["limit"] = limit
+        return stream_ndjson([(query, params)])
+
     with driver.session() as session:
-        result = session.run(query, username=username)
-        communities = []
-        for record in result:
-            c = record["c"]
-            leader_username = record["leader_username"]
-            leader_name = record["leader"]
-            communities.append({
-                "name": c.get("name"),
-                "level": c.get("level"),
-                "motto": c.get("motto"),
-                "leader_username": leader_username,
-                "leader": leader_name
-            })
-    return jsonify(communities)
+        communities = [record.data() for record in session.run(query, **params)]
+    return paged_response(communities, communities, limit, "name")
 
 
 @community_bp.route("/user/update-username", methods=["POST", "OPTIONS"])
@@ -441,14 +751,28 @@ def update_username_community():
         return jsonify({"error": "Both email and new_username are required"}), 400
     try:
         with driver.session() as session:
-            session.run(
+            result = session.run(
                 f"""
                 MATCH (u:{NODE_LABEL_USER} {{email: $email}})
+                WITH u, u.username AS old_username
                 SET u.username = $new_username
-                RETURN u
+                WITH u, old_username
+                OPTIONAL MATCH (u)-[r:CHILD_OF]-()
+                OPTIONAL MATCH (u)-[:CREATED|MEMBER_OF]->(c:{NODE_LABEL_COMMUNITY})
+                RETURN old_username,
+                       collect(DISTINCT r.community) + collect(DISTINCT c.name) AS communities
                 """,
                 email=email, new_username=new_username
             )
+            record = result.single()
+        if record and record["old_username"]:
+            invalidate_profile(record["old_username"])
+        invalidate_profile(new_username)
+        # The username appears in every tree and member list the user is part of
+        for community_name in set(record["communities"] if record else []):
+            parent_index.drop(community_name)
+            invalidate_tree(community_name)
+            invalidate_members(community_name)
         return jsonify({"message": "Username updated in community service"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -462,18 +786,45 @@ def get_leader_and_tree():
     community_name = request.args.get("community")
     if not community_name:
         return jsonify({"error": "Community name is required"}), 400
+
+    version = tree_versions.get(community_name)
+    etag = version_etag("tree", version)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+
+    tree = tree_cache.get(community_name, version=version)
+    if tree is None:
+        tree = load_tree(community_name)
+        if tree is None:
+            return jsonify({"error": "Leader not found"}), 404
+        # Stored under the version read before querying, so a concurrent write makes it stale
+        tree_cache.set(community_name, tree, version=version)
+
+    if request.args.get("layout") in ("1", "true"):
+        layout = layout_cache.get(community_name, version=version)
+        if layout is None:
+            layout = compute_layout(tree)
+            layout_cache.set(community_name, layout, version=version)
+        return with_etag(jsonify(dict(tree, layout=layout)), etag)
+    return with_etag(jsonify(tree), etag)
+
+
+def load_tree(community_name):
+    """Read the leader and every CHILD_OF edge of a community; None if it has no leader."""
     with driver.session() as session:
         # Get leader node
         leader_result = session.run(
             f"""
             MATCH (leader:{NODE_LABEL_USER})-[:CREATED]->(c:{NODE_LABEL_COMMUNITY} {{name: $community_name}})
+            WHERE c.deleting IS NULL
             RETURN leader.username AS username, leader.email AS email, leader.name AS name
             """,
             community_name=community_name
         )
         leader = leader_result.single()
         if not leader:
-            return jsonify({"error": "Leader not found"}), 404
+            return None
         # Get all nodes involved in CHILD_OF relationships for this community
         nodes = {}
         rels = []
@@ -508,16 +859,140 @@ def get_leader_and_tree():
                 "email": leader["email"],
                 "name": leader["name"]
             }
-        print("Leader:", leader)
-        print("Nodes:", nodes)
-        print("Relationships:", rels)
-        return jsonify({
+        return {
             "leader": dict(leader),
             "nodes": list(nodes.values()),
             "relationships": rels
+        }
+
+
+@community_bp.route("/subtree", methods=["GET", "OPTIONS"])
+def get_subtree():
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+
+    community_name = request.args.get("community")
+    if not community_name:
+        return jsonify({"error": "Community name is required"}), 400
+    username = request.args.get("username")
+    depth = int_arg("depth", 1, 1, MAX_TREE_DEPTH)
+    limit = int_arg("limit", 50, 1, MAX_PAGE_SIZE)
+    after = request.args.get("after")
+
+    with driver.session() as session:
+        # Start from the requested node, or from the leader when none is given
+        if username:
+            root_result = session.run(
+                f"""
+                MATCH (c:{NODE_LABEL_COMMUNITY} {{name: $community_name}})
+                WHERE c.deleting IS NULL
+                MATCH (root:{NODE_LABEL_USER} {{username: $username}})
+                RETURN root.username AS username, root.email AS email, root.name AS name
+                """,
+                community_name=community_name, username=username
+            )
+        else:
+            root_result = session.run(
+                f"""
+                MATCH (root:{NODE_LABEL_USER})-[:CREATED]->(c:{NODE_LABEL_COMMUNITY} {{name: $community_name}})
+                WHERE c.deleting IS NULL
+                RETURN root.username AS username, root.email AS email, root.name AS name
+                """,
+                community_name=community_name
+            )
+        root = root_result.single()
+        if not root:
+            return jsonify({"error": "Node not found"}), 404
+
+        # One page of direct children, keyset-paginated on username
+        children_result = session.run(
+            f"""
+            MATCH (child:{NODE_LABEL_USER})-[:CHILD_OF {{community: $community_name}}]->(root:{NODE_LABEL_USER} {{username: $username}})
+            WHERE $after IS NULL OR child.username > $after
+            RETURN child.username AS username, child.email AS email, child.name AS name,
+                   size([(x)-[:CHILD_OF {{community: $community_name}}]->(child) | x]) AS child_count
+            ORDER BY child.username
+            LIMIT $limit
+            """,
+            community_name=community_name, username=root["username"], after=after, limit=limit + 1
+        )
+        children = [dict(record, depth=1) for record in children_result]
+        next_cursor = None
+        if len(children) > limit:
+            children = children[:limit]
+            next_cursor = children[-1]["username"]
+
+        nodes = {child["username"]: child for child in children}
+        rels = [
+            {"from": child["username"], "to": root["username"], "community": community_name}
+            for child in children
+        ]
+        truncated = False
+
+        # Descendants of this page's children, down to the requested depth
+        if depth > 1 and children:
+            result = session.run(
+                f"""
+                UNWIND $children AS child_username
+                MATCH (child:{NODE_LABEL_USER} {{username: child_username}})
+                MATCH p = (d:{NODE_LABEL_USER})-[:CHILD_OF*1..{depth - 1} {{community: $community_name}}]->(child)
+                WITH d, length(p) + 1 AS depth, head(relationships(p)) AS r
+                WITH d, min(depth) AS depth, collect(endNode(r).username)[0] AS parent
+                RETURN d.username AS username, d.email AS email, d.name AS name, depth, parent,
+                       size([(x)-[:CHILD_OF {{community: $community_name}}]->(d) | x]) AS child_count
+                ORDER BY depth, username
+                LIMIT $max_nodes
+                """,
+                children=list(nodes), community_name=community_name, max_nodes=MAX_SUBTREE_NODES + 1
+            )
+            for record in result:
+                if len(nodes) >= MAX_SUBTREE_NODES:
+                    truncated = True
+                    break
+                node = dict(record)
+                parent = node.pop("parent")
+                nodes[node["username"]] = node
+                rels.append({"from": node["username"], "to": parent, "community": community_name})
+
+        return jsonify({
+            "root": dict(root),
+            "nodes": list(nodes.values()),
+            "relationships": rels,
+            "next_cursor": next_cursor,
+            "truncated": truncated
         })
 
 
+@community_bp.route("/ancestors", methods=["GET", "OPTIONS"])
+def get_ancestors():
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+
+    community_name = request.args.get("community")
+    username = request.args.get("username")
+    if not community_name or not username:
+        return jsonify({"error": "Missing community or username"}), 400
+
+    with driver.session() as session:
+        result = session.run(
+            f"""
+            MATCH (c:{NODE_LABEL_COMMUNITY} {{name: $community_name}})
+            WHERE c.deleting IS NULL
+            MATCH (u:{NODE_LABEL_USER} {{username: $username}})
+            OPTIONAL MATCH p = (u)-[:CHILD_OF*1..{MAX_TREE_DEPTH} {{community: $community_name}}]->(:{NODE_LABEL_USER})
+            WITH u, p ORDER BY length(p) DESC
+            LIMIT 1
+            RETURN [n IN coalesce(nodes(p), [u]) | n {{.username, .email, .name}}] AS chain
+            """,
+            username=username, community_name=community_name
+        )
+        record = result.single()
+        if not record:
+            return jsonify({"error": "Node not found"}), 404
+        # Ordered from the requested node up to the top of the tree
+        return jsonify({"ancestors": record["chain"]}), 200
+
+
 @community_bp.route("/create-child-of", methods=["POST", "OPTIONS"])
 def create_child_of():
     if request.method == "OPTIONS":
@@ -529,23 +1004,167 @@ def create_child_of():
     to_username = data.get("to")
     if not community_name or not from_username or not to_username:
         return jsonify({"error": "Missing required fields"}), 400
+    try:
+        with parent_index.editing(community_name) as tree:
+            # O(depth) walk up the cached parent pointers instead of a variable-length query
+            error = edge_error(tree.parents, from_username, to_username)
+            if error:
+                return jsonify({"error": error}), 409
+            with driver.session() as session:
+                record = session.run(
+                    f"""
+                    MATCH (from:{NODE_LABEL_USER} {{username: $from_username}})
+                    MATCH (to:{NODE_LABEL_USER} {{username: $to_username}})
+                    MATCH (c:{NODE_LABEL_COMMUNITY} {{name: $community_name}})
+                    WHERE c.deleting IS NULL
+                    // Guard against a second parent written by another process
+                    WITH from, to, NOT EXISTS {{
+                        MATCH (from)-[other:CHILD_OF {{community: $community_name}}]->(x)
+                        WHERE x <> to
+                    }} AS allowed
+                    CALL {{
+                        WITH from, to, allowed
+                        WITH * WHERE allowed
+                        MERGE (from)-[r:CHILD_OF {{community: $community_name}}]->(to)
+                    }}
+                    RETURN allowed
+                    """,
+                    from_username=from_username,
+                    to_username=to_username,
+                    community_name=community_name
+                ).single()
+            if not record:
+                return jsonify({"error": "User or community not found"}), 404
+            if not record["allowed"]:
+                return jsonify({"error": f"'{from_username}' already has a parent"}), 409
+            tree.set_parent(from_username, to_username)
+        invalidate_tree(community_name)
+        return jsonify({"message": "CHILD_OF relationship created"}), 201
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@community_bp.route("/bulk-child-of", methods=["POST", "OPTIONS"])
+def bulk_create_child_of():
+    """Import many CHILD_OF edges at once.
+
+    Accepts either a JSON body {"community": ..., "relationships": [{"from", "to"}, ...]}
+    or an NDJSON stream of {"from", "to"} lines with ?community=... in the query string.
+    """
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+
+    started = time.monotonic()
+    errors = []
+    if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+        community_name = request.args.get("community")
+        rows = []
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                errors.append({"row": len(rows), "error": "Invalid JSON line"})
+                rows.append(None)
+    else:
+        data = request.get_json(silent=True) or {}
+        community_name = data.get("community") or request.args.get("community")
+        rows = data.get("relationships")
+        if not isinstance(rows, list):
+            return jsonify({"error": "relationships must be a list"}), 400
+    if not community_name:
+        return jsonify({"error": "Community name is required"}), 400
+
+    usernames = set()
+    for row in rows:
+        if isinstance(row, dict):
+            usernames.update(v for v in (row.get("from"), row.get("to")) if isinstance(v, str))
+
     try:
         with driver.session() as session:
-            session.run(
+            community = session.run(
                 f"""
-                MATCH (from:{NODE_LABEL_USER} {{username: $from_username}})
-                MATCH (to:{NODE_LABEL_USER} {{username: $to_username}})
                 MATCH (c:{NODE_LABEL_COMMUNITY} {{name: $community_name}})
-                MERGE (from)-[r:CHILD_OF {{community: $community_name}}]->(to)
-                RETURN from, to, r
+                WHERE c.deleting IS NULL
+                RETURN c.name AS name
                 """,
-                from_username=from_username,
-                to_username=to_username,
                 community_name=community_name
+            ).single()
+            if not community:
+                return jsonify({"error": "Community not found"}), 404
+
+            known_result = session.run(
+                f"""
+                UNWIND $usernames AS username
+                MATCH (u:{NODE_LABEL_USER} {{username: username}})
+                RETURN u.username AS username
+                """,
+                usernames=list(usernames)
             )
-        return jsonify({"message": "CHILD_OF relationship created"}), 201
+            known_usernames = {record["username"] for record in known_result}
+
+            # Validate against a copy; the shared index only learns edges once they are committed
+            with parent_index.editing(community_name) as tree:
+                parents = dict(tree.parents)
+                invalid_rows = {error["row"] for error in errors}
+                accepted, row_errors = validate_edges(
+                    [None if i in invalid_rows else row for i, row in enumerate(rows)],
+                    known_usernames,
+                    parents
+                )
+                errors += [error for error in row_errors if error["row"] not in invalid_rows]
+
+                def create_edges_tx(tx, chunk):
+                    # Lock the community so a deletion cannot start between this check and the commit
+                    alive = tx.run(
+                        f"""
+                        MATCH (c:{NODE_LABEL_COMMUNITY} {{name: $community_name}})
+                        SET c._lock = true
+                        REMOVE c._lock
+                        RETURN c.deleting IS NULL AS alive
+                        """,
+                        community_name=community_name
+                    ).single()
+                    if not alive or not alive["alive"]:
+                        return False
+                    tx.run(
+                        f"""
+                        UNWIND $rows AS row
+                        MATCH (from:{NODE_LABEL_USER} {{username: row.from}})
+                        MATCH (to:{NODE_LABEL_USER} {{username: row.to}})
+                        MERGE (from)-[:CHILD_OF {{community: $community_name}}]->(to)
+                        """,
+                        rows=chunk, community_name=community_name
+                    ).consume()
+                    return True
+
+                created = 0
+                try:
+                    for start in range(0, len(accepted), BULK_CHUNK_SIZE):
+                        chunk = accepted[start:start + BULK_CHUNK_SIZE]
+                        if not session.execute_write(create_edges_tx, chunk):
+                            # Deleted mid-import; edges committed so far go with the community
+                            return jsonify({"error": "Community not found"}), 404
+                        for row in chunk:
+                            tree.set_parent(row["from"], row["to"])
+                        created += len(chunk)
+                finally:
+                    if created:
+                        invalidate_tree(community_name)
     except Exception as e:
-        return jsonify({"error": str(e)}), 400
+        return jsonify({"error": str(e)}), 500
+
+    elapsed = time.monotonic() - started
+    errors.sort(key=lambda error: error["row"])
+    return jsonify({
+        "received": len(rows),
+        "created": created,
+        "errors": errors,
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "rows_per_second": round(len(rows) / elapsed, 1) if elapsed > 0 else None
+    }), 200
+
 
 @community_bp.route("/delete-user-node", methods=["POST", "OPTIONS"])
 def delete_user_node():
@@ -570,6 +1189,9 @@ def delete_user_node():
                 username=username,
                 community_name=community_name
             )
+        with parent_index.editing(community_name) as tree:
+            tree.remove_node(username)
+        invalidate_tree(community_name)
         return jsonify({"message": "Node and its relationships deleted"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -582,33 +1204,50 @@ def get_user_details_by_username():
     username = request.args.get("username")
     if not username:
         return jsonify({"error": "Missing username"}), 400
-    with driver.session() as session:
-        result = session.run(
-            f"""
-            MATCH (u:{NODE_LABEL_USER} {{username: $username}})
-            RETURN u
-            """,
-            username=username
-        )
-        record = result.single()
-        if not record:
-            return jsonify({"error": "User not found"}), 404
-        user_node = record["u"]
-        user_data = {
-            "name": user_node.get("name"),
-            "public_email": user_node.get("public_email"),
-            "dob": user_node.get("dob"),
-            "age": user_node.get("age"),
-            "phone": user_node.get("phone"),
-            "gender": user_node.get("gender"),
-            "location": user_node.get("location"),
-            "bio": user_node.get("bio"),
-            "linkedin": user_node.get("linkedin"),
-            "github": user_node.get("github"),
-            "twitter": user_node.get("twitter"),
-            "website": user_node.get("website")
-        }
-        return jsonify(user_data), 200
+    etag = version_etag("profile", profile_versions.get(username))
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    profile = fetch_profiles([username]).get(username)
+    if profile is None:
+        return jsonify({"error": "User not found"}), 404
+    return with_etag(jsonify(profile), etag), 200
+
+@community_bp.route("/users-details", methods=["GET", "POST", "OPTIONS"])
+def get_users_details():
+    """Profiles for many usernames at once.
+
+    Usernames come from ?usernames=a,b,c or a JSON body {"usernames": [...]};
+    ?fields=name,bio limits each profile to those fields.
+    """
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+
+    if request.method == "POST":
+        usernames = (request.get_json(silent=True) or {}).get("usernames")
+    else:
+        usernames = [u for u in request.args.get("usernames", "").split(",") if u]
+    if not isinstance(usernames, list) or not usernames:
+        return jsonify({"error": "Missing usernames"}), 400
+    if not all(isinstance(username, str) for username in usernames):
+        return jsonify({"error": "usernames must be a list of strings"}), 400
+    if len(usernames) > MAX_BATCH_PROFILES:
+        return jsonify({"error": f"At most {MAX_BATCH_PROFILES} usernames per request"}), 400
+
+    fields = PROFILE_FIELDS
+    if request.args.get("fields"):
+        fields = [field for field in request.args["fields"].split(",") if field in PROFILE_FIELDS]
+        if not fields:
+            return jsonify({"error": "No valid fields requested"}), 400
+
+    profiles = fetch_profiles(usernames)
+    return jsonify({
+        "users": {
+            username: {field: profile.get(field) for field in fields}
+            for username, profile in profiles.items()
+        },
+        "not_found": [username for username in usernames if username not in profiles]
+    }), 200
 
 @community_bp.route("/delete-community", methods=["POST", "OPTIONS"])
 def delete_community():
@@ -621,25 +1260,35 @@ def delete_community():
         return jsonify({"error": "Missing community name"}), 400
     try:
         with driver.session() as session:
-            # Delete all CHILD_OF relationships with this community name
-            session.run(
-                """
-                MATCH ()-[r:CHILD_OF {community: $community_name}]->()
-                DELETE r
-                """,
-                community_name=community_name
+            job_id = session.execute_write(
+                deletion_jobs.create_job_tx, community_name, NODE_LABEL_COMMUNITY
             )
-            # Delete the Community node and all relationships
-            session.run(
-                f"""
-                MATCH (c:{NODE_LABEL_COMMUNITY} {{name: $community_name}})
-                DETACH DELETE c
-                """,
-                community_name=community_name
-            )
-        return jsonify({"message": "Community and related relationships deleted"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    if not job_id:
+        return jsonify({"error": "Community not found"}), 404
+
+    # 🧹 Edges are removed in bounded batches by the deletion worker; readers stop seeing the tree now
+    forget_community(community_name)
+    deletion_jobs.wake()
+    return jsonify({"message": "Community deletion started", "job_id": job_id}), 202
+
+
+@community_bp.route("/delete-community/status", methods=["GET", "OPTIONS"])
+def delete_community_status():
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+
+    job_id = request.args.get("job")
+    if not job_id:
+        return jsonify({"error": "Missing job id"}), 400
+    try:
+        job = deletion_jobs.get_job(driver, job_id)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
 
 @community_bp.route("/members", methods=["GET", "OPTIONS"])
 def get_community_members():
@@ -649,29 +1298,45 @@ def get_community_members():
     community_name = request.args.get("community")
     if not community_name:
         return jsonify({"error": "Missing community name"}), 400
+    after, limit = page_args()
+    leader_query = f"""
+    MATCH (u:{NODE_LABEL_USER})-[:CREATED]->(c:{NODE_LABEL_COMMUNITY} {{name: $community_name}})
+    WHERE c.deleting IS NULL
+    RETURN u.username AS username, u.name AS name
+    """
+    members_query = f"""
+    MATCH (u:{NODE_LABEL_USER})-[:MEMBER_OF]->(c:{NODE_LABEL_COMMUNITY} {{name: $community_name}})
+    WHERE c.deleting IS NULL AND ($after IS NULL OR u.username > $after)
+    RETURN u.username AS username, u.name AS name
+    ORDER BY username
+    {"LIMIT $limit" if limit is not None else ""}
+    """
+    if wants_ndjson():
+        # Leader line first (first page only), then one line per member
+        leader_line = f"""
+        MATCH (u:{NODE_LABEL_USER})-[:CREATED]->(c:{NODE_LABEL_COMMUNITY} {{name: $community_name}})
+        WHERE $after IS NULL AND c.deleting IS NULL
+        RETURN u.username AS username, u.name AS name, 'leader' AS role
+        """
+        params = {"community_name": community_name, "after": after, "limit": limit}
+        return stream_ndjson([(leader_line, params), (members_query, params)])
+
+    etag = version_etag("members", member_versions.get(community_name))
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+
     with driver.session() as session:
-        # Get leader
-        leader_result = session.run(
-            f"""
-            MATCH (u:{NODE_LABEL_USER})-[:CREATED]->(c:{NODE_LABEL_COMMUNITY} {{name: $community_name}})
-            RETURN u.username AS username, u.name AS name
-            """,
-            community_name=community_name
-        )
-        leader = leader_result.single()
-        # Get members
+        leader = session.run(leader_query, community_name=community_name).single()
         members_result = session.run(
-            f"""
-            MATCH (u:{NODE_LABEL_USER})-[:MEMBER_OF]->(c:{NODE_LABEL_COMMUNITY} {{name: $community_name}})
-            RETURN u.username AS username, u.name AS name
-            """,
-            community_name=community_name
+            members_query,
+            community_name=community_name, after=after, limit=limit + 1 if limit else None
         )
         members = [dict(record) for record in members_result]
-        return jsonify({
-            "leader": dict(leader) if leader else None,
-            "members": members
-        })
+    return with_etag(paged_response({
+        "leader": dict(leader) if leader else None,
+        "members": members
+    }, members, limit, "username"), etag)
 
 @community_bp.route("/remove-member", methods=["POST", "OPTIONS"])
 def remove_member():
@@ -689,10 +1354,38 @@ def remove_member():
                 f"""
                 MATCH (u:{NODE_LABEL_USER} {{username: $username}})-[r:MEMBER_OF]->(c:{NODE_LABEL_COMMUNITY} {{name: $community_name}})
                 DELETE r
+                SET c.member_count = coalesce(c.member_count, 1) - 1
                 """,
                 username=username,
                 community_name=community_name
             )
+        invalidate_members(community_name)
         return jsonify({"message": "Member removed from community"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+@community_bp.route("/cache-stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify({
+        "tree": tree_cache.stats(),
+        "layout": layout_cache.stats(),
+        "profile": profile_cache.stats(),
+        "token": token_cache.stats()
+    }), 200
+
+
+@community_bp.route("/upstream-stats", methods=["GET"])
+def get_upstream_stats():
+    return jsonify(upstream_stats()), 200
+
+
+@community_bp.route("/repair-counters", methods=["POST"])
+def repair_counters():
+    community_name = (request.get_json(silent=True) or {}).get("community")
+    with driver.session() as session:
+        summary = session.run(REPAIR_COUNTERS_QUERY, community_name=community_name).consume()
+    return jsonify({
+        "message": "Counters recomputed",
+        "properties_set": summary.counters.properties_set
+    }), 200
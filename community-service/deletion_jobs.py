@@ -0,0 +1,150 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+NODE_LABEL_DELETION_JOB = "communityservice_deletion_job"
+
+DELETE_BATCH_SIZE = int(os.getenv("DELETE_BATCH_SIZE", 1000))
+DELETE_POLL_INTERVAL = float(os.getenv("DELETE_POLL_INTERVAL", 5))
+DELETE_LEASE_SECONDS = 120
+DELETE_BACKOFF_BASE = float(os.getenv("DELETE_BACKOFF_BASE", 2))
+DELETE_BACKOFF_MAX = float(os.getenv("DELETE_BACKOFF_MAX", 300))
+
+_wakeup = threading.Event()
+
+
+def create_job_tx(tx, community_name, community_label):
+    """Mark the community as deleting and return its unfinished job, creating one if needed."""
+    record = tx.run(f"""
+        MATCH (c:{community_label} {{name: $community_name}})
+        SET c.deleting = true
+        MERGE (j:{NODE_LABEL_DELETION_JOB} {{community: $community_name, finished: false}})
+        ON CREATE SET j.id = randomUUID(), j.status = 'pending', j.phase = 'child_of',
+                      j.deleted_relationships = 0, j.created_at = datetime(), j.updated_at = datetime()
+        RETURN j.id AS id
+    """, community_name=community_name).single()
+    return record["id"] if record else None
+
+
+def get_job(driver, job_id):
+    with driver.session() as session:
+        record = session.run(f"""
+            MATCH (j:{NODE_LABEL_DELETION_JOB} {{id: $job_id}})
+            RETURN j {{.id, .community, .status, .phase, .deleted_relationships, .attempts, .error,
+                       created_at: toString(j.created_at), updated_at: toString(j.updated_at)}} AS job
+        """, job_id=job_id).single()
+        return record["job"] if record else None
+
+
+def wake():
+    _wakeup.set()
+
+
+def claim_job_tx(tx):
+    record = tx.run(f"""
+        MATCH (j:{NODE_LABEL_DELETION_JOB} {{finished: false}})
+        WHERE j.locked_until IS NULL OR j.locked_until < datetime()
+        WITH j ORDER BY j.created_at
+        LIMIT 1
+        SET j.status = 'running', j.locked_until = datetime() + duration({{seconds: $lease}})
+        RETURN j {{.*}} AS job
+    """, lease=DELETE_LEASE_SECONDS).single()
+    return record["job"] if record else None
+
+
+def delete_batch_tx(tx, job_id, phase, community_name, community_label):
+    """Delete one bounded batch and record progress in the same transaction."""
+    if phase == "child_of":
+        query = """
+            MATCH ()-[r:CHILD_OF {community: $community_name}]->()
+            WITH r LIMIT $batch
+            DELETE r
+            RETURN count(*) AS deleted
+        """
+    else:
+        query = f"""
+            MATCH (:{community_label} {{name: $community_name}})-[r]-()
+            WITH r LIMIT $batch
+            DELETE r
+            RETURN count(*) AS deleted
+        """
+    deleted = tx.run(query, community_name=community_name, batch=DELETE_BATCH_SIZE).single()["deleted"]
+    next_phase = phase
+    if deleted < DELETE_BATCH_SIZE:
+        next_phase = "community_edges" if phase == "child_of" else "community_node"
+    tx.run(f"""
+        MATCH (j:{NODE_LABEL_DELETION_JOB} {{id: $job_id}})
+        SET j.deleted_relationships = j.deleted_relationships + $deleted,
+            j.phase = $phase,
+            j.updated_at = datetime(),
+            j.locked_until = datetime() + duration({{seconds: $lease}})
+    """, job_id=job_id, deleted=deleted, phase=next_phase, lease=DELETE_LEASE_SECONDS)
+    return next_phase
+
+
+def finish_job_tx(tx, job_id, community_name, community_label):
+    tx.run(f"""
+        MATCH (c:{community_label} {{name: $community_name}})
+        DETACH DELETE c
+    """, community_name=community_name)
+    tx.run(f"""
+        MATCH (j:{NODE_LABEL_DELETION_JOB} {{id: $job_id}})
+        SET j.status = 'done', j.phase = 'done', j.finished = true,
+            j.locked_until = null, j.updated_at = datetime()
+    """, job_id=job_id)
+
+
+def fail_job_tx(tx, job_id, attempts, error):
+    """Park the job until its backoff expires so a persistent failure is not retried in a tight loop."""
+    delay = int(min(DELETE_BACKOFF_BASE ** attempts, DELETE_BACKOFF_MAX))
+    tx.run(f"""
+        MATCH (j:{NODE_LABEL_DELETION_JOB} {{id: $job_id}})
+        SET j.status = 'retrying', j.error = $error, j.attempts = $attempts,
+            j.locked_until = datetime() + duration({{seconds: $delay}}), j.updated_at = datetime()
+    """, job_id=job_id, attempts=attempts, delay=delay, error=error)
+
+
+def run_job(driver, job, community_label, on_finished):
+    community_name = job["community"]
+    phase = job["phase"]
+    with driver.session() as session:
+        try:
+            while phase != "community_node":
+                phase = session.execute_write(
+                    delete_batch_tx, job["id"], phase, community_name, community_label
+                )
+            session.execute_write(finish_job_tx, job["id"], community_name, community_label)
+        except Exception as e:
+            print(f"Deletion job {job['id']} failed, will resume:", e, flush=True)
+            attempts = (job.get("attempts") or 0) + 1
+            session.execute_write(fail_job_tx, job["id"], attempts, str(e))
+            return
+    print(f"✅ Community '{community_name}' deleted", flush=True)
+    on_finished(community_name)
+
+
+def run_worker(driver, community_label, on_finished):
+    while True:
+        try:
+            # Unfinished jobs, including ones interrupted by a crash, are picked up here
+            while True:
+                with driver.session() as session:
+                    job = session.execute_write(claim_job_tx)
+                if not job:
+                    break
+                run_job(driver, job, community_label, on_finished)
+        except Exception as e:
+            print("Deletion worker error:", e, flush=True)
+        _wakeup.wait(DELETE_POLL_INTERVAL)
+        _wakeup.clear()
+
+
+def start_worker(driver, community_label, on_finished):
+    thread = threading.Thread(
+        target=run_worker, args=(driver, community_label, on_finished),
+        name="community-deletion", daemon=True
+    )
+    thread.start()
+    return thread
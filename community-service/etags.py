@@ -0,0 +1,26 @@
+import hashlib
+import uuid
+from flask import Response, request
+
+# Versions restart at 0 with the process, so every ETag carries this process's boot id
+BOOT_ID = uuid.uuid4().hex[:12]
+
+
+def version_etag(kind, version, scope=""):
+    """Strong ETag for the current request URL (and caller scope) at the given entity version."""
+    digest = hashlib.sha1(f"{kind}:{scope}:{request.full_path}".encode()).hexdigest()[:16]
+    return f"{kind}-{BOOT_ID}-{digest}-{version}"
+
+
+def not_modified(etag):
+    """A 304 response if the client already holds `etag`, otherwise None."""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    return response
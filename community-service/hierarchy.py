@@ -0,0 +1,123 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+def would_create_cycle(parents, child, parent):
+    """Return True if making `child` a CHILD_OF `parent` closes a loop in `parents`."""
+    node = parent
+    seen = set()
+    while node is not None and node not in seen:
+        if node == child:
+            return True
+        seen.add(node)
+        node = parents.get(node)
+    return node is not None
+
+
+def edge_error(parents, child, parent):
+    """Why `child` cannot become a CHILD_OF `parent`, or None if it can. O(depth)."""
+    if child == parent:
+        return "A user cannot be their own parent"
+    if child in parents and parents[child] != parent:
+        return f"'{child}' already has parent '{parents[child]}'"
+    if would_create_cycle(parents, child, parent):
+        return "Relationship would create a cycle"
+    return None
+
+
+def validate_edges(rows, known_usernames, parents):
+    """Validate (from, to) rows against the current child -> parent map.
+
+    Accepted rows are applied to `parents` in place so later rows are checked
+    against earlier ones. Returns (accepted, errors) where accepted is a list of
+    {"from", "to"} dicts and errors is a per-row report.
+    """
+    accepted = []
+    errors = []
+    for index, row in enumerate(rows):
+        child = row.get("from") if isinstance(row, dict) else None
+        parent = row.get("to") if isinstance(row, dict) else None
+        error = None
+        if not child or not parent:
+            error = "Missing from/to"
+        elif not isinstance(child, str) or not isinstance(parent, str):
+            error = "from/to must be usernames"
+        elif child not in known_usernames:
+            error = f"Unknown user '{child}'"
+        elif parent not in known_usernames:
+            error = f"Unknown user '{parent}'"
+        elif parents.get(child) == parent:
+            continue  # Edge already exists, MERGE would be a no-op
+        else:
+            error = edge_error(parents, child, parent)
+
+        if error:
+            errors.append({"row": index, "from": child, "to": parent, "error": error})
+            continue
+        parents[child] = parent
+        accepted.append({"from": child, "to": parent})
+    return accepted, errors
+
+
+class CommunityTree:
+    """child -> parent pointers for one community, with the reverse map for removals."""
+
+    def __init__(self, edges=()):
+        self.parents = {}
+        self.children = {}
+        for child, parent in edges:
+            self.set_parent(child, parent)
+
+    def set_parent(self, child, parent):
+        old_parent = self.parents.get(child)
+        if old_parent is not None:
+            self.children[old_parent].discard(child)
+        self.parents[child] = parent
+        self.children.setdefault(parent, set()).add(child)
+
+    def remove_node(self, username):
+        """Drop every edge from or to `username`, as /delete-user-node does."""
+        parent = self.parents.pop(username, None)
+        if parent is not None:
+            self.children[parent].discard(username)
+        for child in self.children.pop(username, ()):
+            self.parents.pop(child, None)
+
+
+class ParentIndex:
+    """Lazily loaded CommunityTree per community, bounded by LRU.
+
+    `loader(community_name)` returns the community's (child, parent) edges.
+    Writers hold the community's lock from validation until the index is updated.
+    """
+
+    def __init__(self, loader, max_communities=256, lock_stripes=64):
+        self._loader = loader
+        self._max_communities = max_communities
+        self._trees = OrderedDict()
+        self._trees_lock = threading.Lock()
+        self._locks = [threading.Lock() for _ in range(lock_stripes)]
+
+    def _lock_for(self, community_name):
+        return self._locks[hash(community_name) % len(self._locks)]
+
+    @contextmanager
+    def editing(self, community_name):
+        with self._lock_for(community_name):
+            with self._trees_lock:
+                tree = self._trees.get(community_name)
+                if tree is not None:
+                    self._trees.move_to_end(community_name)
+            if tree is None:
+                tree = CommunityTree(self._loader(community_name))
+                with self._trees_lock:
+                    self._trees[community_name] = tree
+                    while len(self._trees) > self._max_communities:
+                        self._trees.popitem(last=False)
+            yield tree
+
+    def drop(self, community_name):
+        with self._lock_for(community_name):
+            with self._trees_lock:
+                self._trees.pop(community_name, None)
@@ -0,0 +1,205 @@
+import datetime
+import os
+import threading
+import jwt
+import requests
+from dotenv import load_dotenv
+from http_client import CircuitOpenError, get_upstream
+
+load_dotenv()
+
+NOTIFY_URL = os.getenv("NOTIFY_URL")
+SECRET_KEY = os.getenv("SECRET_KEY")
+
+NODE_LABEL_OUTBOX = "communityservice_outbox"
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 50))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 2))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", 2))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", 300))
+OUTBOX_LEASE_SECONDS = 60
+
+# Notification-service endpoint, required body fields and optional body fields for each kind of intent
+OUTBOX_KINDS = {
+    "notify": (
+        "/api/notify/",
+        ("to", "message", "type"),
+        ("community", "requester_email", "request_id"),
+    ),
+    "mark_handled": (
+        "/api/notify/mark-handled",
+        ("requester", "community", "decision"),
+        ("requester_email", "request_id"),
+    ),
+}
+# Intents of these kinds from the same sender are delivered together: (endpoint, success status)
+OUTBOX_BULK_PATHS = {
+    "notify": ("/api/notify/bulk", "sent"),
+    "mark_handled": ("/api/notify/mark-handled/bulk", "handled"),
+}
+
+# The notification service could not be reached at all; retried without using up an attempt
+UNAVAILABLE_ERRORS = (CircuitOpenError, requests.ConnectionError)
+
+notify_service = get_upstream("notification", NOTIFY_URL)
+_wakeup = threading.Event()
+
+
+def enqueue_clause(kind, **fields):
+    """Cypher CREATE clause that records a notification intent in the caller's transaction.
+
+    `fields` maps body keys to Cypher expressions. The sender is taken from the
+    $sender_email and $sender_username query parameters.
+    """
+    _, required, optional = OUTBOX_KINDS[kind]
+    assert set(required) <= set(fields) <= set(required) | set(optional), f"Unexpected fields for {kind}"
+    props = ", ".join(f"`{key}`: {expression}" for key, expression in fields.items())
+    return f"""
+        CREATE (:{NODE_LABEL_OUTBOX} {{
+            id: randomUUID(), kind: '{kind}', {props},
+            sender_email: $sender_email, sender_username: $sender_username,
+            attempts: 0, next_attempt_at: datetime(), created_at: datetime()
+        }})
+    """
+
+
+def wake():
+    """Ask the dispatcher to drain the outbox now instead of at the next poll."""
+    _wakeup.set()
+
+
+def claim_batch_tx(tx, limit):
+    result = tx.run(f"""
+        MATCH (o:{NODE_LABEL_OUTBOX})
+        WHERE o.next_attempt_at <= datetime() AND o.dead IS NULL
+          AND (o.locked_until IS NULL OR o.locked_until < datetime())
+        WITH o ORDER BY o.next_attempt_at
+        LIMIT $limit
+        SET o.locked_until = datetime() + duration({{seconds: $lease}})
+        RETURN o {{.*}} AS item
+    """, limit=limit, lease=OUTBOX_LEASE_SECONDS)
+    return [record["item"] for record in result]
+
+
+def complete_tx(tx, delivered, failed):
+    tx.run(f"""
+        UNWIND $ids AS id
+        MATCH (o:{NODE_LABEL_OUTBOX} {{id: id}})
+        DELETE o
+    """, ids=delivered)
+    tx.run(f"""
+        UNWIND $failed AS f
+        MATCH (o:{NODE_LABEL_OUTBOX} {{id: f.id}})
+        SET o.attempts = f.attempts,
+            o.last_error = f.error,
+            o.locked_until = null,
+            o.next_attempt_at = datetime() + duration({{seconds: f.delay}}),
+            o.dead = CASE WHEN f.attempts >= $max_attempts THEN true ELSE null END
+    """, failed=failed, max_attempts=OUTBOX_MAX_ATTEMPTS)
+
+
+def sender_token(item):
+    """Short-lived token on behalf of the user who triggered the notification."""
+    payload = {
+        "email": item["sender_email"],
+        "username": item.get("sender_username"),
+        "exp": datetime.datetime.utcnow() + datetime.timedelta(minutes=5),
+    }
+    return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+
+
+def body(item):
+    _, required, optional = OUTBOX_KINDS[item["kind"]]
+    fields = {key: item.get(key) for key in required}
+    fields.update({key: item[key] for key in optional if item.get(key) is not None})
+    return fields
+
+
+def deliver(item):
+    path, _, _ = OUTBOX_KINDS[item["kind"]]
+    response = notify_service.post(
+        path,
+        json=body(item),
+        headers={"Authorization": f"Bearer {sender_token(item)}"},
+    )
+    if response.status_code >= 300:
+        raise RuntimeError(f"{response.status_code} {response.text[:200]}")
+
+
+def deliver_bulk(items):
+    """Deliver intents of one kind that share a sender in one request. Returns {id: error or None}."""
+    path, ok_status = OUTBOX_BULK_PATHS[items[0]["kind"]]
+    response = notify_service.post(
+        path,
+        json={"items": [body(item) for item in items]},
+        headers={"Authorization": f"Bearer {sender_token(items[0])}"},
+    )
+    if response.status_code >= 300 and response.status_code != 207:
+        raise RuntimeError(f"{response.status_code} {response.text[:200]}")
+    outcome = {item["id"]: "Missing from bulk response" for item in items}
+    for result in response.json().get("results", []):
+        item = items[result["index"]]
+        outcome[item["id"]] = None if result["status"] == ok_status else result.get("error", result["status"])
+    return outcome
+
+
+def drain_once(driver):
+    """Deliver one batch of due intents. Returns the number of intents claimed."""
+    with driver.session() as session:
+        items = session.execute_write(claim_batch_tx, OUTBOX_BATCH_SIZE)
+        if not items:
+            return 0
+        delivered, failed = [], []
+
+        def record(item, error):
+            if error is None:
+                delivered.append(item["id"])
+                return
+            attempts = item.get("attempts", 0)
+            if not isinstance(error, UNAVAILABLE_ERRORS):
+                attempts += 1
+            delay = int(min(OUTBOX_BACKOFF_BASE ** max(attempts, 1), OUTBOX_BACKOFF_MAX))
+            failed.append({"id": item["id"], "attempts": attempts, "delay": delay, "error": str(error)})
+            print(f"Outbox delivery failed (attempt {attempts}):", error, flush=True)
+
+        by_sender = {}
+        for item in items:
+            if item["kind"] in OUTBOX_BULK_PATHS:
+                key = (item["kind"], item["sender_email"], item.get("sender_username"))
+                by_sender.setdefault(key, []).append(item)
+                continue
+            try:
+                deliver(item)
+                record(item, None)
+            except Exception as e:
+                record(item, e)
+
+        for group in by_sender.values():
+            try:
+                outcome = deliver_bulk(group)
+            except Exception as e:
+                outcome = {item["id"]: e for item in group}
+            for item in group:
+                record(item, outcome[item["id"]])
+
+        session.execute_write(complete_tx, delivered, failed)
+        return len(items)
+
+
+def run_dispatcher(driver):
+    while True:
+        try:
+            # Keep draining while full batches come back
+            while drain_once(driver) >= OUTBOX_BATCH_SIZE:
+                pass
+        except Exception as e:
+            print("Outbox dispatcher error:", e, flush=True)
+        _wakeup.wait(OUTBOX_POLL_INTERVAL)
+        _wakeup.clear()
+
+
+def start_dispatcher(driver):
+    thread = threading.Thread(target=run_dispatcher, args=(driver,), name="outbox-dispatcher", daemon=True)
+    thread.start()
+    return thread
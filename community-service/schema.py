@@ -0,0 +1,183 @@
+import os
+from dotenv import load_dotenv
+from community_routes import (
+    NODE_LABEL_USER, NODE_LABEL_COMMUNITY, COMMUNITY_NAME_FULLTEXT_INDEX, REPAIR_COUNTERS_QUERY,
+    COMMUNITY_TOTAL_QUERY, browse_query
+)
+from outbox import NODE_LABEL_OUTBOX
+from deletion_jobs import NODE_LABEL_DELETION_JOB
+
+load_dotenv()
+
+SCHEMA_LABEL = "communityservice_schema"
+SCHEMA_STRICT = os.getenv("SCHEMA_STRICT", "false").lower() in ("1", "true", "yes")
+
+# Applied in order; every statement must be idempotent. A failed migration does not
+# block later ones outside SCHEMA_STRICT, so each must stand on its own
+MIGRATIONS = [
+    (1, "User lookup constraints", [
+        f"CREATE CONSTRAINT communityservice_usernode_email IF NOT EXISTS "
+        f"FOR (u:{NODE_LABEL_USER}) REQUIRE u.email IS UNIQUE",
+        f"CREATE INDEX communityservice_usernode_username IF NOT EXISTS "
+        f"FOR (u:{NODE_LABEL_USER}) ON (u.username)",
+    ]),
+    (2, "Community name constraint", [
+        f"CREATE CONSTRAINT communityservice_community_name IF NOT EXISTS "
+        f"FOR (c:{NODE_LABEL_COMMUNITY}) REQUIRE c.name IS UNIQUE",
+    ]),
+    (3, "CHILD_OF community index", [
+        "CREATE INDEX communityservice_child_of_community IF NOT EXISTS "
+        "FOR ()-[r:CHILD_OF]-() ON (r.community)",
+    ]),
+    (4, "Community name full-text index", [
+        f"CREATE FULLTEXT INDEX {COMMUNITY_NAME_FULLTEXT_INDEX} IF NOT EXISTS "
+        f"FOR (c:{NODE_LABEL_COMMUNITY}) ON EACH [c.name]",
+    ]),
+    (5, "Notification outbox indexes", [
+        f"CREATE CONSTRAINT communityservice_outbox_id IF NOT EXISTS "
+        f"FOR (o:{NODE_LABEL_OUTBOX}) REQUIRE o.id IS UNIQUE",
+        f"CREATE INDEX communityservice_outbox_next_attempt IF NOT EXISTS "
+        f"FOR (o:{NODE_LABEL_OUTBOX}) ON (o.next_attempt_at)",
+    ]),
+    (6, "Backfill community member/pending counters", [
+        REPAIR_COUNTERS_QUERY.replace("$community_name", "null"),
+    ]),
+    (7, "Community deletion job indexes", [
+        f"CREATE CONSTRAINT communityservice_deletion_job_id IF NOT EXISTS "
+        f"FOR (j:{NODE_LABEL_DELETION_JOB}) REQUIRE j.id IS UNIQUE",
+        f"CREATE INDEX communityservice_deletion_job_community IF NOT EXISTS "
+        f"FOR (j:{NODE_LABEL_DELETION_JOB}) ON (j.community, j.finished)",
+    ]),
+    (8, "Deleting community index", [
+        f"CREATE INDEX communityservice_community_deleting IF NOT EXISTS "
+        f"FOR (c:{NODE_LABEL_COMMUNITY}) ON (c.deleting)",
+    ]),
+]
+
+# Queries that must be served by index seeks, checked with EXPLAIN at startup
+HOT_QUERIES = {
+    "user by email": (
+        f"MATCH (u:{NODE_LABEL_USER} {{email: $email}}) RETURN u",
+        {"email": ""},
+    ),
+    "user by username": (
+        f"MATCH (u:{NODE_LABEL_USER} {{username: $username}}) RETURN u",
+        {"username": ""},
+    ),
+    "join check": (
+        f"MATCH (c:{NODE_LABEL_COMMUNITY} {{name: $name}})<-[:CREATED]-(creator:{NODE_LABEL_USER}) "
+        f"RETURN creator.email",
+        {"name": ""},
+    ),
+    "tree edges": (
+        f"MATCH (u:{NODE_LABEL_USER})-[r:CHILD_OF {{community: $community_name}}]->(v:{NODE_LABEL_USER}) "
+        f"RETURN u.username, v.username",
+        {"community_name": ""},
+    ),
+    "community browse": (
+        browse_query(after=True),
+        {"after_name": "", "limit": 21, "current_user": ""},
+    ),
+    "community browse first page": (
+        browse_query(after=False),
+        {"limit": 21, "current_user": ""},
+    ),
+    "community total": (COMMUNITY_TOTAL_QUERY, {}),
+    "deletion batch": (
+        "MATCH ()-[r:CHILD_OF {community: $community_name}]->() WITH r LIMIT 1000 DELETE r",
+        {"community_name": ""},
+    ),
+}
+
+SCAN_OPERATORS = {
+    "AllNodesScan",
+    "NodeByLabelScan",
+    "DirectedAllRelationshipsScan",
+    "UndirectedAllRelationshipsScan",
+    "DirectedRelationshipTypeScan",
+    "UndirectedRelationshipTypeScan",
+}
+
+
+def applied_migrations(session):
+    record = session.run(
+        f"MATCH (s:{SCHEMA_LABEL}) RETURN s.version AS version, s.applied AS applied"
+    ).single()
+    if not record:
+        return set()
+    # Older schema nodes only hold the highest version, applied in order up to it
+    return set(record["applied"] or []) | set(range(1, (record["version"] or 0) + 1))
+
+
+def run_migrations(driver):
+    """Apply every pending migration and return the versions that are now applied."""
+    with driver.session() as session:
+        applied = applied_migrations(session)
+        for target, description, statements in MIGRATIONS:
+            if target in applied:
+                continue
+            try:
+                for statement in statements:
+                    session.run(statement).consume()
+            except Exception as e:
+                message = f"Schema migration {target} ({description}) failed: {e}"
+                if SCHEMA_STRICT:
+                    raise RuntimeError(message) from e
+                # Skipped, not recorded, so it is retried on the next start; later ones still run
+                print("⚠️", message, flush=True)
+                continue
+            applied.add(target)
+            session.run(
+                f"""
+                MERGE (s:{SCHEMA_LABEL})
+                SET s.applied = $applied, s.version = $version, s.applied_at = datetime()
+                """,
+                applied=sorted(applied), version=contiguous_version(applied)
+            ).consume()
+            print(f"✅ Applied schema migration {target}: {description}", flush=True)
+    return applied
+
+
+def contiguous_version(applied):
+    """Highest version with every earlier migration applied too."""
+    version = 0
+    while version + 1 in applied:
+        version += 1
+    return version
+
+
+def plan_operators(plan):
+    """Yield every operator name in an EXPLAIN plan tree."""
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        yield node["operatorType"].split("@")[0]
+        stack.extend(node.get("children", []))
+
+
+def verify_indexes(driver):
+    """EXPLAIN the hot queries and report any that fall back to a scan."""
+    problems = []
+    with driver.session() as session:
+        for name, (query, params) in HOT_QUERIES.items():
+            plan = session.run("EXPLAIN " + query, params).consume().plan
+            scans = sorted(set(plan_operators(plan)) & SCAN_OPERATORS) if plan else []
+            if scans:
+                problems.append(f"{name}: {', '.join(scans)}")
+    if problems:
+        message = "Hot queries are not using indexes: " + "; ".join(problems)
+        if SCHEMA_STRICT:
+            raise RuntimeError(message)
+        print("⚠️", message, flush=True)
+    return problems
+
+
+def bootstrap_schema(driver):
+    """Run at startup: apply pending migrations, then check hot query plans."""
+    try:
+        run_migrations(driver)
+        verify_indexes(driver)
+    except Exception as e:
+        if SCHEMA_STRICT:
+            raise
+        print("⚠️ Schema bootstrap failed:", e, flush=True)
@@ -0,0 +1,199 @@
+"""Tidy tree layout (Buchheim, Jünger & Leipert's linear-time variant of Walker's algorithm).
+
+Coordinates are in grid units: siblings are at least one unit apart on x and
+each level is one unit down on y. Clients scale them to pixels.
+"""
+
+
+class _Node:
+    __slots__ = (
+        "username", "parent", "children", "number", "x", "y", "mod", "thread",
+        "ancestor", "change", "shift", "default_ancestor", "size",
+    )
+
+    def __init__(self, username, parent=None, number=1):
+        self.username = username
+        self.parent = parent
+        self.children = []
+        self.number = number  # 1-based position among siblings
+        self.x = 0.0
+        self.y = 0
+        self.mod = 0.0
+        self.thread = None
+        self.ancestor = self
+        self.change = 0.0
+        self.shift = 0.0
+        self.default_ancestor = None
+        self.size = 1
+
+    def left(self):
+        return self.thread or (self.children[0] if self.children else None)
+
+    def right(self):
+        return self.thread or (self.children[-1] if self.children else None)
+
+    def left_brother(self):
+        return self.parent.children[self.number - 2] if self.parent and self.number > 1 else None
+
+    def leftmost_sibling(self):
+        return self.parent.children[0] if self.parent and self.number > 1 else None
+
+
+def _build(root_username, children_of, seen):
+    """Build the _Node tree breadth-first, visiting each username at most once."""
+    root = _Node(root_username)
+    seen.add(root_username)
+    queue = [root]
+    for node in queue:
+        for child in children_of.get(node.username, ()):
+            if child in seen:
+                continue
+            seen.add(child)
+            child_node = _Node(child, node, len(node.children) + 1)
+            node.children.append(child_node)
+            queue.append(child_node)
+    return root
+
+
+def _move_subtree(wl, wr, shift):
+    subtrees = wr.number - wl.number
+    wr.change -= shift / subtrees
+    wr.shift += shift
+    wl.change += shift / subtrees
+    wr.x += shift
+    wr.mod += shift
+
+
+def _execute_shifts(v):
+    shift = change = 0.0
+    for w in reversed(v.children):
+        w.x += shift
+        w.mod += shift
+        change += w.change
+        shift += w.shift + change
+
+
+def _ancestor(vil, v, default_ancestor):
+    return vil.ancestor if vil.ancestor.parent is v.parent else default_ancestor
+
+
+def _apportion(v, default_ancestor, distance):
+    w = v.left_brother()
+    if w is None:
+        return default_ancestor
+    vir = vor = v
+    vil = w
+    vol = v.leftmost_sibling()
+    sir = sor = v.mod
+    sil = vil.mod
+    sol = vol.mod
+    while vil.right() and vir.left():
+        vil = vil.right()
+        vir = vir.left()
+        vol = vol.left()
+        vor = vor.right()
+        vor.ancestor = v
+        shift = (vil.x + sil) - (vir.x + sir) + distance
+        if shift > 0:
+            _move_subtree(_ancestor(vil, v, default_ancestor), v, shift)
+            sir += shift
+            sor += shift
+        sil += vil.mod
+        sir += vir.mod
+        sol += vol.mod
+        sor += vor.mod
+    if vil.right() and not vor.right():
+        vor.thread = vil.right()
+        vor.mod += sil - sor
+    else:
+        if vir.left() and not vol.left():
+            vol.thread = vir.left()
+            vol.mod += sir - sol
+        default_ancestor = v
+    return default_ancestor
+
+
+def _first_walk(root, distance):
+    # Iterative post-order so deep hierarchies don't hit the recursion limit
+    stack = [(root, False)]
+    while stack:
+        v, visited = stack.pop()
+        if not visited:
+            stack.append((v, True))
+            v.default_ancestor = v.children[0] if v.children else None
+            stack.extend((child, False) for child in reversed(v.children))
+            continue
+        brother = v.left_brother()
+        if not v.children:
+            v.x = brother.x + distance if brother else 0.0
+        else:
+            _execute_shifts(v)
+            midpoint = (v.children[0].x + v.children[-1].x) / 2
+            if brother:
+                v.x = brother.x + distance
+                v.mod = v.x - midpoint
+            else:
+                v.x = midpoint
+            v.size = 1 + sum(child.size for child in v.children)
+        if v.parent:
+            v.parent.default_ancestor = _apportion(v, v.parent.default_ancestor, distance)
+
+
+def _second_walk(root):
+    stack = [(root, 0.0, 0)]
+    while stack:
+        v, m, depth = stack.pop()
+        v.x += m
+        v.y = depth
+        yield v
+        stack.extend((child, m + v.mod, depth + 1) for child in reversed(v.children))
+
+
+def compute_layout(tree, distance=1.0):
+    """Lay out a /leader-node-and-tree payload.
+
+    Returns {"nodes": {username: {x, y, depth, order, subtree_size, parent}}, "width", "height"}.
+    Nodes that are not connected to the leader are laid out as extra trees to its right.
+    """
+    children_of = {}
+    has_parent = set()
+    for rel in sorted(tree["relationships"], key=lambda r: (r["to"] or "", r["from"] or "")):
+        if rel["from"] in has_parent:
+            continue  # A node is drawn under its first parent only
+        has_parent.add(rel["from"])
+        children_of.setdefault(rel["to"], []).append(rel["from"])
+
+    leader = tree["leader"]["username"]
+    usernames = sorted(node["username"] for node in tree["nodes"])
+    roots = [leader] + [u for u in usernames if u != leader and u not in has_parent]
+
+    # One virtual root keeps the whole forest in a single tidy layout
+    forest = _Node(None)
+    seen = set()
+    for root_username in roots + usernames:
+        if root_username in seen:
+            continue  # Already placed, or a cycle member reached from another root
+        subtree = _build(root_username, children_of, seen)
+        subtree.parent = forest
+        subtree.number = len(forest.children) + 1
+        forest.children.append(subtree)
+
+    _first_walk(forest, distance)
+    positioned = [v for v in _second_walk(forest) if v is not forest]
+    min_x = min((v.x for v in positioned), default=0.0)
+
+    nodes = {}
+    for v in positioned:
+        nodes[v.username] = {
+            "x": round(v.x - min_x, 3),
+            "y": v.y - 1,
+            "depth": v.y - 1,
+            "order": v.number - 1,
+            "subtree_size": v.size,
+            "parent": v.parent.username,
+        }
+    return {
+        "nodes": nodes,
+        "width": max((n["x"] for n in nodes.values()), default=0.0),
+        "height": max((n["y"] for n in nodes.values()), default=0),
+    }
@@ -1,7 +1,12 @@
 from flask import Flask
 from flask_cors import CORS
-from notification_routes import notification_bp
+from notification_routes import notification_bp, write_buffer
+from utils import driver
+from schema import bootstrap_schema
 import os
+import sys
+import atexit
+import signal
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,10 +18,20 @@ CORS(app,
      origins=[FRONTEND_URL],
      methods=["GET", "POST", "OPTIONS"],
      allow_headers=["Content-Type", "Authorization"],
+     expose_headers=["X-Next-Cursor"],
      supports_credentials=True)
 # ✅ Register Blueprint
 app.register_blueprint(notification_bp, url_prefix="/api/notify")
 
+# 🗂️ Create constraints and indexes, then check that hot queries use them
+bootstrap_schema(driver)
+
+# 💾 Commit anything still buffered before the process exits
+if write_buffer is not None:
+    atexit.register(write_buffer.close)
+
 if __name__ == "__main__":
+    # docker stop sends SIGTERM; exit normally so the atexit flush runs
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
     port = int(os.environ.get("PORT", 5003))
     app.run(host="0.0.0.0", port=port)
@@ -0,0 +1,110 @@
+import jwt
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from dotenv import load_dotenv
+from flask import request, jsonify, g
+
+load_dotenv()
+SECRET_KEY = os.getenv("SECRET_KEY")
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+# Longest a verified token is trusted without re-verifying, whatever its exp
+TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", 300))
+
+
+class TokenCache:
+    """LRU of sha256(token) -> payload for tokens that already passed signature verification."""
+
+    def __init__(self, max_entries=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._data.get(digest)
+            if entry is not None:
+                payload, expires_at = entry
+                if expires_at > time.time():
+                    self._data.move_to_end(digest)
+                    self.hits += 1
+                    return payload
+                del self._data[digest]
+            self.misses += 1
+            return None
+
+    def set(self, digest, payload):
+        expires_at = time.time() + self.ttl
+        if isinstance(payload.get("exp"), (int, float)):
+            expires_at = min(expires_at, payload["exp"])
+        with self._lock:
+            self._data[digest] = (payload, expires_at)
+            self._data.move_to_end(digest)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+token_cache = TokenCache()
+
+def decode_verified(token):
+    """jwt.decode, skipped for tokens verified recently; raises the same jwt errors."""
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(digest)
+    if payload is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        token_cache.set(digest, payload)
+    return dict(payload)
+
+def bearer_token(allow_query_token=False):
+    auth_header = request.headers.get("Authorization")
+    if auth_header and auth_header.startswith("Bearer "):
+        return auth_header.split(" ")[1]
+    if allow_query_token:
+        return request.args.get("token")
+    return None
+
+def verify_jwt_token(allow_query_token=False):
+    token = bearer_token(allow_query_token)
+    if not token:
+        return None, jsonify({"error": "Unauthorized - Token missing"}), 401
+    try:
+        return decode_verified(token), None, 200
+    except jwt.ExpiredSignatureError:
+        return None, jsonify({"error": "Token expired"}), 401
+    except jwt.InvalidTokenError:
+        return None, jsonify({"error": "Invalid token"}), 401
+
+def require_auth(view=None, allow_query_token=False):
+    """Route decorator: verify the bearer token and put its payload in g.jwt_payload.
+
+    CORS preflight (OPTIONS) requests reach the view unauthenticated.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != "OPTIONS":
+                payload, error_response, status = verify_jwt_token(allow_query_token)
+                if error_response:
+                    return error_response, status
+                g.jwt_payload = payload
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator(view) if view is not None else decorator
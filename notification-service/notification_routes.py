@@ -1,29 +1,184 @@
-from flask import Blueprint, request, jsonify
-from utils import driver, SECRET_KEY
-import jwt
+from flask import Blueprint, request, jsonify, Response, stream_with_context, g
+from utils import driver
+from auth_utils import require_auth, token_cache
+from cache import LRUCache, VersionCounter
+from etags import version_etag, not_modified, with_etag
+from pubsub import broker
+from write_buffer import WRITE_BEHIND, WriteBuffer, BufferFullError
+import os
+import json
+import base64
+import queue
+import threading
 
 NODE_LABEL_USER = "notifications_usernode"
 NODE_LABEL_NOTIFICATION = "notifications_notification"
+NODE_LABEL_ARCHIVED = "notifications_archived"
+
+# Notifications kept in the hot inbox; older ones move to the archive label
+INBOX_SIZE = int(os.getenv("INBOX_SIZE", 20))
+MAX_BULK_ITEMS = 5000
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", 500))
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", 20))
+MAX_SSE_CONNECTIONS = int(os.getenv("MAX_SSE_CONNECTIONS", 500))
+INBOX_CACHE_SIZE = int(os.getenv("INBOX_CACHE_SIZE", 10000))
+INBOX_CACHE_TTL = int(os.getenv("INBOX_CACHE_TTL", 60))
+MAX_HISTORY_PAGE_SIZE = 100
+
+# Optional, indexed fields that identify what a notification is about
+STRUCTURED_FIELDS = ("community", "requester_email", "request_id")
+
+# Writes one notification per $items row; the per-row subquery keeps sequence numbers
+# correct when several rows go to the same receiver
+INSERT_NOTIFICATIONS_QUERY = f"""
+UNWIND $items AS item
+CALL {{
+    WITH item
+    MERGE (u:{NODE_LABEL_USER} {{email: item.to}})
+    // The per-user sequence makes the inbox a ring: each insert evicts at most one item
+    SET u.next_seq = coalesce(u.next_seq, 0) + 1
+    CREATE (n:{NODE_LABEL_NOTIFICATION} {{
+        message: item.message,
+        type: item.type,
+        from_email: item.from_email,
+        from_username: item.from_username,
+        timestamp: datetime(),
+        seq: u.next_seq,
+        community: item.community,
+        requester_email: item.requester_email,
+        request_id: item.request_id
+    }})
+    CREATE (u)-[:HAS_NOTIFICATION]->(n)
+
+    // Archive whatever fell out of the inbox; only INBOX_SIZE edges are ever expanded
+    WITH u, n
+    CALL {{
+        WITH u
+        OPTIONAL MATCH (u)-[r:HAS_NOTIFICATION]->(old:{NODE_LABEL_NOTIFICATION})
+        WHERE old.seq <= u.next_seq - $inbox_size
+        FOREACH (x IN CASE WHEN old IS NULL THEN [] ELSE [1] END |
+            DELETE r
+            REMOVE old:{NODE_LABEL_NOTIFICATION}
+            SET old:{NODE_LABEL_ARCHIVED}, old.archived_at = datetime(), old.owner = u.email
+            CREATE (u)-[:ARCHIVED_NOTIFICATION]->(old)
+        )
+    }}
+    RETURN n
+}}
+RETURN item.to AS to,
+       n.seq AS seq,
+       n.message AS message,
+       toString(n.timestamp) AS timestamp,
+       n.type AS type,
+       n.from_username AS sender,
+       n.from_email AS sender_email,
+       n.community AS community,
+       n.requester_email AS requester_email,
+       n.request_id AS request_id
+"""
+
+
+def insert_notifications_tx(tx, items):
+    """Write `items` and return the stored notifications, in the same order."""
+    result = tx.run(INSERT_NOTIFICATIONS_QUERY, items=items, inbox_size=INBOX_SIZE)
+    return [record.data() for record in result]
+
 
 notification_bp = Blueprint("notifications", __name__)
 
+# Bumped whenever a user's inbox changes; drives the /fetch ETag
+inbox_versions = VersionCounter()
+
+# 📬 Latest notifications and read position per user, patched in place by writes
+inbox_cache = LRUCache(max_entries=INBOX_CACHE_SIZE, ttl=INBOX_CACHE_TTL)
+_inbox_lock = threading.Lock()
+
+
+def load_inbox(email):
+    """Return {"notifications", "next_seq", "read_seq"} for `email`, reading Neo4j only on a miss."""
+    version = inbox_versions.get(email)
+    inbox = inbox_cache.get(email, version)
+    if inbox is not None:
+        return inbox
+    with driver.session() as session:
+        record = session.run(f"""
+            OPTIONAL MATCH (u:{NODE_LABEL_USER} {{email: $email}})
+            OPTIONAL MATCH (u)-[:HAS_NOTIFICATION]->(n:{NODE_LABEL_NOTIFICATION})
+            WITH u, n ORDER BY n.timestamp DESC
+            LIMIT $limit
+            RETURN coalesce(u.next_seq, 0) AS next_seq,
+                   coalesce(u.read_seq, 0) AS read_seq,
+                   [x IN collect(n) | {{
+                       seq: x.seq,
+                       message: x.message,
+                       timestamp: toString(x.timestamp),
+                       type: x.type,
+                       sender: x.from_username,
+                       sender_email: x.from_email,
+                       community: x.community,
+                       requester_email: x.requester_email,
+                       request_id: x.request_id
+                   }}] AS notifications
+        """, email=email, limit=INBOX_SIZE).single()
+    inbox = record.data()
+    # Stored under the version read before the query, so a write that raced with it invalidates it
+    inbox_cache.set(email, inbox, version)
+    return inbox
+
+
+def update_inbox(email, apply):
+    """Bump the user's inbox version and patch a cached inbox with `apply(inbox) -> inbox`."""
+    with _inbox_lock:
+        inbox = inbox_cache.get(email, inbox_versions.get(email))
+        version = inbox_versions.bump(email)
+        if inbox is not None:
+            inbox_cache.set(email, apply(inbox), version)
+
+
+def unread_count(inbox):
+    return max(inbox["next_seq"] - inbox["read_seq"], 0)
+
+
+def notifications_committed(created):
+    """Apply committed notifications to cached inboxes and push them to open /stream connections."""
+    by_receiver = {}
+    for notification in created:
+        by_receiver.setdefault(notification.pop("to"), []).append(notification)
+    for receiver, notifications in by_receiver.items():
+        def add(inbox, notifications=notifications):
+            # A load that raced with this write may already hold some of these rows
+            fresh = {n["seq"] for n in notifications}
+            kept = [n for n in inbox["notifications"] if n["seq"] not in fresh]
+            merged = sorted(notifications + kept, key=lambda n: n["timestamp"] or "", reverse=True)
+            return {
+                "notifications": merged[:INBOX_SIZE],
+                "next_seq": max([inbox["next_seq"]] + [n["seq"] for n in notifications]),
+                "read_seq": inbox["read_seq"],
+            }
+        update_inbox(receiver, add)
+        for notification in notifications:
+            broker.publish(receiver, {"event": "notification", "id": notification["seq"], "data": notification})
+
+
+def write_notifications(items):
+    with driver.session() as session:
+        created = session.execute_write(insert_notifications_tx, items)
+    notifications_committed(created)
+
+
+# ⏱️ Optional write-behind: single notifications are acknowledged once queued and committed in groups
+write_buffer = WriteBuffer(write_notifications) if WRITE_BEHIND else None
+
+
 @notification_bp.route("/", methods=["POST", "OPTIONS"])
+@require_auth
 def create_notification():
     if request.method == "OPTIONS":
         return jsonify({"status": "ok"}), 200
     # 🔐 Extract token
-    auth_header = request.headers.get("Authorization")
-    print("[DEBUG] Auth header (create_notification):", auth_header)
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized"}), 401
-    token = auth_header.split(" ")[1]
-    print("[DEBUG] Token (create_notification):", token)
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        sender_email = payload["email"]
-        sender_username = payload.get("username", "Unknown")  # ✅ Get username from token
-    except jwt.InvalidTokenError:
-        return jsonify({"error": "Invalid token"}), 401
+    payload = g.jwt_payload
+    sender_email = payload["email"]
+    sender_username = payload.get("username", "Unknown")  # ✅ Get username from token
 
     # 📦 Request body
     data = request.json
@@ -34,108 +189,442 @@ def create_notification():
     if not receiver_email or not message:
         return jsonify({"error": "Missing required fields"}), 400
 
-    try:
-        def create_notification_tx(tx):
-            tx.run(f"""
-                MERGE (u:{NODE_LABEL_USER} {{email: $receiver}})
-                CREATE (n:{NODE_LABEL_NOTIFICATION} {{
-                    message: $message,
-                    type: $type,
-                    from_email: $from_email,
-                    from_username: $from_username,
-                    timestamp: datetime()
-                }})
-                CREATE (u)-[:HAS_NOTIFICATION]->(n)
-
-                // Clean up old notifications after 20
-                WITH u
-                MATCH (u)-[r:HAS_NOTIFICATION]->(old:{NODE_LABEL_NOTIFICATION})
-                WITH u, r, old ORDER BY old.timestamp DESC
-                SKIP 20
-                FOREACH (x IN CASE WHEN old IS NULL THEN [] ELSE [1] END | DELETE r, old)
-            """, 
-                receiver=receiver_email,
-                message=message,
-                type=notif_type,
-                from_email=sender_email,
-                from_username=sender_username
-            )
-
-        with driver.session() as session:
-            session.write_transaction(create_notification_tx)
+    item = {
+        "to": receiver_email,
+        "message": message,
+        "type": notif_type,
+        "from_email": sender_email,
+        "from_username": sender_username,
+    }
+    item.update({field: data.get(field) for field in STRUCTURED_FIELDS})
 
+    if write_buffer is not None:
+        try:
+            write_buffer.submit(item)
+        except BufferFullError as e:
+            response = jsonify({"error": str(e)})
+            response.headers["Retry-After"] = "1"
+            return response, 503
+        return jsonify({"message": "Notification queued"}), 202
+
+    try:
+        write_notifications([item])
         return jsonify({"message": "Notification sent successfully"}), 201
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+# 📣 Fan-out: many notifications from one sender, written a chunk per transaction
+@notification_bp.route("/bulk", methods=["POST", "OPTIONS"])
+@require_auth
+def create_notifications_bulk():
+    """Body: {"items": [{"to", "message", "type", optional STRUCTURED_FIELDS}, ...]}.
+
+    Returns a status per item, in request order: "sent", "invalid" or "failed".
+    """
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+    payload = g.jwt_payload
+    sender_email = payload["email"]
+    sender_username = payload.get("username", "Unknown")
+
+    items = (request.get_json(silent=True) or {}).get("items")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "items must be a non-empty list"}), 400
+    if len(items) > MAX_BULK_ITEMS:
+        return jsonify({"error": f"At most {MAX_BULK_ITEMS} items per request"}), 400
+
+    results = []
+    valid = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get("to") or not item.get("message"):
+            results.append({"index": index, "status": "invalid", "error": "Missing required fields"})
+            continue
+        # Neo4j rejects map/list properties, which would fail every row in the chunk
+        text_fields = [item["to"], item["message"], item.get("type", "system")]
+        text_fields += [item.get(field) for field in STRUCTURED_FIELDS if item.get(field) is not None]
+        if not all(isinstance(value, str) for value in text_fields):
+            results.append({"index": index, "status": "invalid", "error": "Fields must be strings"})
+            continue
+        results.append({"index": index, "to": item["to"], "status": "pending"})
+        fields = {
+            "to": item["to"],
+            "message": item["message"],
+            "type": item.get("type", "system"),
+            "from_email": sender_email,
+            "from_username": sender_username,
+        }
+        fields.update({field: item.get(field) for field in STRUCTURED_FIELDS})
+        valid.append((index, fields))
+
+    with driver.session() as session:
+        for start in range(0, len(valid), BULK_CHUNK_SIZE):
+            chunk = valid[start:start + BULK_CHUNK_SIZE]
+            try:
+                created = session.execute_write(insert_notifications_tx, [item for _, item in chunk])
+            except Exception as e:
+                for index, _ in chunk:
+                    results[index].update(status="failed", error=str(e))
+                continue
+            for index, _ in chunk:
+                results[index]["status"] = "sent"
+            notifications_committed(created)
+
+    sent = sum(1 for result in results if result["status"] == "sent")
+    return jsonify({
+        "sent": sent,
+        "not_sent": len(results) - sent,
+        "results": results
+    }), 201 if sent == len(results) else 207
+
+
 # 📥 Get latest 20 notifications
 @notification_bp.route("/fetch", methods=["GET", "OPTIONS"])
+@require_auth
 def get_notifications():
     if request.method == "OPTIONS":
         return jsonify({"status": "ok"}), 200
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized"}), 401
-    token = auth_header.split(" ")[1]
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        user_email = payload["email"]
-    except jwt.InvalidTokenError:
-        return jsonify({"error": "Invalid token"}), 401
+    payload = g.jwt_payload
+    user_email = payload["email"]
+
+    etag = version_etag("inbox", inbox_versions.get(user_email), scope=user_email)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+
+    notifications = load_inbox(user_email)["notifications"]
+    return with_etag(jsonify(notifications), etag), 200
+
+
+# 🔢 Unread badge, served from the inbox cache
+@notification_bp.route("/count", methods=["GET", "OPTIONS"])
+@require_auth
+def get_unread_count():
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+    payload = g.jwt_payload
+    user_email = payload["email"]
+
+    inbox = load_inbox(user_email)
+    return jsonify({
+        "unread": unread_count(inbox),
+        "pending_requests": sum(1 for n in inbox["notifications"] if n["type"] == "join_request"),
+    }), 200
+
+
+@notification_bp.route("/mark-read", methods=["POST", "OPTIONS"])
+@require_auth
+def mark_notifications_read():
+    """Mark everything up to {"seq": n} (default: the newest notification) as read."""
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+    payload = g.jwt_payload
+    user_email = payload["email"]
+
+    seq = (request.get_json(silent=True) or {}).get("seq")
+    if seq is not None and not isinstance(seq, int):
+        return jsonify({"error": "seq must be an integer"}), 400
 
     with driver.session() as session:
-        result = session.run(f"""
-            MATCH (u:{NODE_LABEL_USER} {{email: $email}})-[:HAS_NOTIFICATION]->(n:{NODE_LABEL_NOTIFICATION})
-            RETURN n.message AS message, 
-                   toString(n.timestamp) AS timestamp, 
-                   n.type AS type, 
-                   n.from_username AS sender,
-                   n.from_email AS sender_email
-            ORDER BY n.timestamp DESC
-            LIMIT 20
-        """, email=user_email)
+        record = session.run(f"""
+            MATCH (u:{NODE_LABEL_USER} {{email: $email}})
+            WITH u, CASE
+                WHEN $seq IS NULL OR $seq > coalesce(u.next_seq, 0) THEN coalesce(u.next_seq, 0)
+                ELSE $seq
+            END AS target
+            // The read position only moves forward
+            SET u.read_seq = CASE WHEN target > coalesce(u.read_seq, 0) THEN target ELSE u.read_seq END
+            RETURN u.read_seq AS read_seq, coalesce(u.next_seq, 0) AS next_seq
+        """, email=user_email, seq=seq).single()
+    if not record:
+        return jsonify({"read_seq": 0, "unread": 0}), 200
+
+    def mark_read(inbox):
+        return dict(inbox, read_seq=record["read_seq"])
+
+    update_inbox(user_email, mark_read)
+    return jsonify({
+        "read_seq": record["read_seq"],
+        "unread": max(record["next_seq"] - record["read_seq"], 0)
+    }), 200
+
+# 🎯 Resolve the exact join request through an index; message matching is only for legacy rows
+MARK_HANDLED_MATCHES = {
+    "request_id": f"""
+        MATCH (n:{NODE_LABEL_NOTIFICATION} {{request_id: item.request_id}})
+        WHERE n.type = 'join_request'
+          AND EXISTS {{ (:{NODE_LABEL_USER} {{email: $creator_email}})-[:HAS_NOTIFICATION]->(n) }}
+    """,
+    "requester_email": f"""
+        MATCH (n:{NODE_LABEL_NOTIFICATION} {{community: item.community, requester_email: item.requester_email}})
+        WHERE n.type = 'join_request'
+          AND EXISTS {{ (:{NODE_LABEL_USER} {{email: $creator_email}})-[:HAS_NOTIFICATION]->(n) }}
+    """,
+    "requester": f"""
+        MATCH (u:{NODE_LABEL_USER} {{email: $creator_email}})-[:HAS_NOTIFICATION]->(n:{NODE_LABEL_NOTIFICATION})
+        WHERE n.type = 'join_request' AND n.from_username = item.requester
+          AND (n.community = item.community
+               OR (n.community IS NULL AND n.message ENDS WITH " community '" + item.community + "'"))
+    """,
+}
+
+
+def mark_handled_error(item):
+    """Why `item` is not a valid mark-handled request, or None if it is."""
+    if not isinstance(item, dict):
+        return "Missing or invalid data"
+    keys = [item.get(field) for field in ("request_id", "requester_email", "requester")]
+    if not any(keys) or not all(key is None or isinstance(key, str) for key in keys):
+        return "Missing or invalid data"
+    if not isinstance(item.get("community"), str) or not item["community"]:
+        return "Missing or invalid data"
+    if item.get("decision") not in ("accept", "reject"):
+        return "Missing or invalid data"
+    return None
+
+
+def mark_handled_tx(tx, creator_email, items):
+    """Rewrite the join requests named by `items` (dicts with an "index") in one transaction.
+
+    Returns {"index", "seq", "message", "timestamp"} for every notification updated.
+    """
+    groups = {}
+    for item in items:
+        key = "request_id" if item.get("request_id") else "requester_email" if item.get("requester_email") else "requester"
+        groups.setdefault(key, []).append(item)
+    updated = []
+    for key, group in groups.items():
+        result = tx.run("UNWIND $items AS item" + MARK_HANDLED_MATCHES[key] + """
+            SET n.message = 'You ' + item.decision + 'ed a request',
+                n.type = 'system',
+                n.timestamp = datetime()
+            RETURN item.index AS index, n.seq AS seq, n.message AS message, toString(n.timestamp) AS timestamp
+        """, creator_email=creator_email, items=group)
+        updated += [record.data() for record in result]
+    return updated
+
+
+def handled_committed(creator_email, items, updated):
+    """Apply committed mark-handled updates to the creator's cached inbox and open streams."""
+    by_seq = {n["seq"]: n for n in updated}
+
+    def mark_handled(inbox):
+        notifications = [
+            dict(n, message=by_seq[n["seq"]]["message"], type="system", timestamp=by_seq[n["seq"]]["timestamp"])
+            if n["seq"] in by_seq else n
+            for n in inbox["notifications"]
+        ]
+        notifications.sort(key=lambda n: n["timestamp"] or "", reverse=True)
+        return dict(inbox, notifications=notifications)
+
+    update_inbox(creator_email, mark_handled)
+    for item in items:
+        broker.publish(creator_email, {"event": "handled", "data": {"requester": item.get("requester"), "community": item["community"]}})
+
+
+def handled_item(index, item):
+    fields = {field: item.get(field) for field in ("requester", "requester_email", "request_id", "community", "decision")}
+    return dict(fields, index=index)
 
-        notifications = [record.data() for record in result]
-        return jsonify(notifications), 200
 
 @notification_bp.route("/mark-handled", methods=["POST", "OPTIONS"])
+@require_auth
 def mark_notification_handled():
     if request.method == "OPTIONS":
         return jsonify({"status": "ok"}), 200
-    auth_header = request.headers.get("Authorization")
-    print("[DEBUG] Auth header (mark_notification_handled):", auth_header)
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized"}), 401
-    token = auth_header.split(" ")[1]
-    print("[DEBUG] Token (mark_notification_handled):", token)
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        creator_email = payload["email"]
-    except jwt.InvalidTokenError:
-        return jsonify({"error": "Invalid token"}), 401
+    payload = g.jwt_payload
+    creator_email = payload["email"]
 
     data = request.json
-    requester_name = data.get("requester")
-    community = data.get("community")
-    decision = data.get("decision")
+    error = mark_handled_error(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    items = [handled_item(0, data)]
+    with driver.session() as session:
+        updated = session.execute_write(mark_handled_tx, creator_email, items)
+    handled_committed(creator_email, items, updated)
 
-    if not requester_name or not community or decision not in ("accept", "reject"):
-        return jsonify({"error": "Missing or invalid data"}), 400
+    return jsonify({"message": "Notification updated"}), 200
+
+
+@notification_bp.route("/mark-handled/bulk", methods=["POST", "OPTIONS"])
+@require_auth
+def mark_notifications_handled_bulk():
+    """Body: {"items": [{"community", "decision", and "request_id", "requester_email" or "requester"}, ...]}.
+
+    Returns a status per item, in request order: "handled", "invalid" or "failed".
+    """
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+    payload = g.jwt_payload
+    creator_email = payload["email"]
+
+    items = (request.get_json(silent=True) or {}).get("items")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "items must be a non-empty list"}), 400
+    if len(items) > MAX_BULK_ITEMS:
+        return jsonify({"error": f"At most {MAX_BULK_ITEMS} items per request"}), 400
+
+    results = []
+    valid = []
+    for index, item in enumerate(items):
+        error = mark_handled_error(item)
+        if error:
+            results.append({"index": index, "status": "invalid", "error": error})
+            continue
+        results.append({"index": index, "status": "pending"})
+        valid.append(handled_item(index, item))
 
     with driver.session() as session:
-        # ✅ Build the new message
-        new_msg = f"You {decision}ed a request"
-        new_type = "system"
+        for start in range(0, len(valid), BULK_CHUNK_SIZE):
+            chunk = valid[start:start + BULK_CHUNK_SIZE]
+            try:
+                updated = session.execute_write(mark_handled_tx, creator_email, chunk)
+            except Exception as e:
+                for item in chunk:
+                    results[item["index"]].update(status="failed", error=str(e))
+                continue
+            for item in chunk:
+                results[item["index"]]["status"] = "handled"
+            handled_committed(creator_email, chunk, updated)
 
-        session.run(f"""
-            MATCH (u:{NODE_LABEL_USER} {{email: $creator_email}})-[:HAS_NOTIFICATION]->(n:{NODE_LABEL_NOTIFICATION})
-            WHERE n.message CONTAINS $community AND n.from_username = $requester_name AND n.type = 'join_request'
-            SET n.message = $new_msg
-            SET n.type = $new_type
-            SET n.timestamp = datetime()
+    handled = sum(1 for result in results if result["status"] == "handled")
+    return jsonify({
+        "handled": handled,
+        "not_handled": len(results) - handled,
+        "results": results
+    }), 200 if handled == len(results) else 207
 
-        """, creator_email=creator_email, community=community, requester_name=requester_name, new_msg=new_msg, new_type = new_type)
 
-    return jsonify({"message": "Notification updated"}), 200
+def encode_cursor(notification):
+    raw = json.dumps([notification["timestamp"], notification["seq"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return (timestamp, seq) from an X-Next-Cursor value, or None if it is malformed."""
+    try:
+        timestamp, seq = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(timestamp, str) or not isinstance(seq, int):
+        return None
+    return timestamp, seq
+
+
+# 🗄️ Archived notifications, newest first, paged with a (timestamp, seq) keyset cursor
+@notification_bp.route("/history", methods=["GET", "OPTIONS"])
+@require_auth
+def get_notification_history():
+    """Older notifications than /fetch returns. Pass X-Next-Cursor back as ?after= for the next page."""
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+    payload = g.jwt_payload
+    user_email = payload["email"]
+
+    try:
+        limit = max(1, min(int(request.args.get("limit", 20)), MAX_HISTORY_PAGE_SIZE))
+    except ValueError:
+        limit = 20
+    after = None
+    if request.args.get("after"):
+        after = decode_cursor(request.args["after"])
+        if after is None:
+            return jsonify({"error": "Invalid cursor"}), 400
+
+    with driver.session() as session:
+        # The (owner, timestamp) index serves both the range and the ordering
+        result = session.run(f"""
+            MATCH (n:{NODE_LABEL_ARCHIVED} {{owner: $email}})
+            WHERE n.timestamp IS NOT NULL
+              AND ($after_ts IS NULL OR n.timestamp <= datetime($after_ts))
+            WITH n
+            WHERE $after_ts IS NULL OR n.timestamp < datetime($after_ts) OR n.seq < $after_seq
+            RETURN n.seq AS seq,
+                   n.message AS message,
+                   toString(n.timestamp) AS timestamp,
+                   n.type AS type,
+                   n.from_username AS sender,
+                   n.from_email AS sender_email,
+                   n.community AS community,
+                   n.requester_email AS requester_email,
+                   n.request_id AS request_id
+            ORDER BY n.timestamp DESC, n.seq DESC
+            LIMIT $limit
+        """, email=user_email, after_ts=after[0] if after else None,
+            after_seq=after[1] if after else None, limit=limit + 1)
+        notifications = [record.data() for record in result]
+
+    response = jsonify(notifications[:limit])
+    if len(notifications) > limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(notifications[limit - 1])
+    return response, 200
+
+
+_stream_slots = threading.BoundedSemaphore(MAX_SSE_CONNECTIONS)
+
+
+def sse_format(event):
+    lines = [f"event: {event['event']}"]
+    if event.get("id") is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"data: {json.dumps(event['data'])}")
+    return "\n".join(lines) + "\n\n"
+
+
+# 📡 Server-Sent Events: new notifications are pushed as they commit instead of polled from /fetch
+@notification_bp.route("/stream", methods=["GET", "OPTIONS"])
+# EventSource cannot set headers, so the token may also come from ?token=
+@require_auth(allow_query_token=True)
+def stream_notifications():
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+    user_email = g.jwt_payload["email"]
+
+    if not _stream_slots.acquire(blocking=False):
+        response = jsonify({"error": "Too many open streams, fall back to polling /fetch"})
+        response.headers["Retry-After"] = "30"
+        return response, 503
+    subscription = broker.subscribe(user_email)
+
+    def generate():
+        yield f"retry: 3000\n{sse_format({'event': 'ready', 'data': {}})}"
+        while True:
+            try:
+                event = subscription.get(timeout=SSE_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            yield sse_format(event)
+
+    def close():
+        broker.unsubscribe(user_email, subscription)
+        _stream_slots.release()
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    # Runs when the client goes away, even if the generator never started
+    response.call_on_close(close)
+    return response
+
+
+@notification_bp.route("/stream-stats", methods=["GET"])
+def stream_stats():
+    return jsonify(broker.stats()), 200
+
+
+@notification_bp.route("/cache-stats", methods=["GET"])
+def cache_stats():
+    return jsonify({"inbox": inbox_cache.stats(), "token": token_cache.stats()}), 200
+
+
+@notification_bp.route("/write-buffer-stats", methods=["GET"])
+def write_buffer_stats():
+    if write_buffer is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify(dict(write_buffer.stats(), enabled=True)), 200
@@ -0,0 +1,75 @@
+import os
+import queue
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "memory")
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("SUBSCRIBER_QUEUE_SIZE", 100))
+
+
+class InProcessBroker:
+    """Fan-out of events to subscribers in this process, one channel per user email.
+
+    Any broker with the same subscribe/unsubscribe/publish/stats methods can replace it;
+    the routes only talk to `broker`.
+    """
+
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.published = 0
+        self.dropped = 0
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, channel, subscription):
+        with self._lock:
+            subscribers = self._channels.get(channel)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._channels[channel]
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+            self.published += 1
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait(event)
+            except queue.Full:
+                # A stalled client loses events rather than blocking writers; it resyncs via /fetch
+                with self._lock:
+                    self.dropped += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "memory",
+                "channels": len(self._channels),
+                "subscribers": sum(len(s) for s in self._channels.values()),
+                "published": self.published,
+                "dropped": self.dropped,
+            }
+
+
+BROKERS = {
+    "memory": InProcessBroker,
+}
+
+
+def create_broker(backend=PUBSUB_BACKEND):
+    if backend not in BROKERS:
+        raise ValueError(f"Unknown PUBSUB_BACKEND '{backend}'")
+    return BROKERS[backend]()
+
+
+broker = create_broker()
@@ -0,0 +1,187 @@
+import os
+from dotenv import load_dotenv
+from notification_routes import NODE_LABEL_USER, NODE_LABEL_NOTIFICATION, NODE_LABEL_ARCHIVED
+
+load_dotenv()
+
+SCHEMA_LABEL = "notifications_schema"
+SCHEMA_STRICT = os.getenv("SCHEMA_STRICT", "false").lower() in ("1", "true", "yes")
+
+# Applied in order; every statement must be idempotent. A failed migration does not
+# block later ones outside SCHEMA_STRICT, so each must stand on its own
+MIGRATIONS = [
+    (1, "Notification user email constraint", [
+        f"CREATE CONSTRAINT notifications_usernode_email IF NOT EXISTS "
+        f"FOR (u:{NODE_LABEL_USER}) REQUIRE u.email IS UNIQUE",
+    ]),
+    (2, "Backfill inbox sequence numbers", [
+        f"""
+        MATCH (u:{NODE_LABEL_USER})
+        WHERE u.next_seq IS NULL
+        CALL {{
+            WITH u
+            CALL {{
+                WITH u
+                MATCH (u)-[:HAS_NOTIFICATION]->(n:{NODE_LABEL_NOTIFICATION})
+                WITH n ORDER BY n.timestamp
+                WITH collect(n) AS inbox
+                UNWIND range(0, size(inbox) - 1) AS i
+                WITH inbox[i] AS n, i
+                SET n.seq = i + 1
+                RETURN count(n) AS total
+            }}
+            SET u.next_seq = total
+        }} IN TRANSACTIONS OF 500 ROWS
+        """,
+    ]),
+    (3, "Structured join-request fields", [
+        f"CREATE INDEX notifications_notification_request_id IF NOT EXISTS "
+        f"FOR (n:{NODE_LABEL_NOTIFICATION}) ON (n.request_id)",
+        f"CREATE INDEX notifications_notification_community_requester IF NOT EXISTS "
+        f"FOR (n:{NODE_LABEL_NOTIFICATION}) ON (n.community, n.requester_email)",
+        # Recover the fields from messages written before they existed
+        f"""
+        MATCH (n:{NODE_LABEL_NOTIFICATION})
+        WHERE n.type = 'join_request' AND n.community IS NULL
+          AND n.message CONTAINS " requested to join your community '"
+        CALL {{
+            WITH n
+            WITH n, split(n.message, " requested to join your community '")[1] AS quoted
+            SET n.community = left(quoted, size(quoted) - 1),
+                n.requester_email = n.from_email
+        }} IN TRANSACTIONS OF 500 ROWS
+        """,
+    ]),
+    (4, "Notification archive history index", [
+        f"CREATE INDEX notifications_archived_owner_timestamp IF NOT EXISTS "
+        f"FOR (n:{NODE_LABEL_ARCHIVED}) ON (n.owner, n.timestamp)",
+        f"""
+        MATCH (u:{NODE_LABEL_USER})-[:ARCHIVED_NOTIFICATION]->(n:{NODE_LABEL_ARCHIVED})
+        WHERE n.owner IS NULL
+        CALL {{
+            WITH u, n
+            SET n.owner = u.email
+        }} IN TRANSACTIONS OF 1000 ROWS
+        """,
+    ]),
+]
+
+# Queries that must be served by index seeks, checked with EXPLAIN at startup
+HOT_QUERIES = {
+    "fetch notifications": (
+        f"""
+        MATCH (u:{NODE_LABEL_USER} {{email: $email}})-[:HAS_NOTIFICATION]->(n:{NODE_LABEL_NOTIFICATION})
+        RETURN n.message ORDER BY n.timestamp DESC LIMIT 20
+        """,
+        {"email": ""},
+    ),
+    "notification history": (
+        f"""
+        MATCH (n:{NODE_LABEL_ARCHIVED} {{owner: $email}})
+        WHERE n.timestamp <= datetime()
+        RETURN n.message ORDER BY n.timestamp DESC LIMIT 20
+        """,
+        {"email": ""},
+    ),
+    "join request by id": (
+        f"MATCH (n:{NODE_LABEL_NOTIFICATION} {{request_id: $request_id}}) RETURN n",
+        {"request_id": ""},
+    ),
+    "join request by community and requester": (
+        f"MATCH (n:{NODE_LABEL_NOTIFICATION} {{community: $community, requester_email: $requester_email}}) RETURN n",
+        {"community": "", "requester_email": ""},
+    ),
+}
+
+SCAN_OPERATORS = {
+    "AllNodesScan",
+    "NodeByLabelScan",
+    "DirectedAllRelationshipsScan",
+    "UndirectedAllRelationshipsScan",
+    "DirectedRelationshipTypeScan",
+    "UndirectedRelationshipTypeScan",
+}
+
+
+def applied_migrations(session):
+    record = session.run(
+        f"MATCH (s:{SCHEMA_LABEL}) RETURN s.version AS version, s.applied AS applied"
+    ).single()
+    if not record:
+        return set()
+    # Older schema nodes only hold the highest version, applied in order up to it
+    return set(record["applied"] or []) | set(range(1, (record["version"] or 0) + 1))
+
+
+def run_migrations(driver):
+    """Apply every pending migration and return the versions that are now applied."""
+    with driver.session() as session:
+        applied = applied_migrations(session)
+        for target, description, statements in MIGRATIONS:
+            if target in applied:
+                continue
+            try:
+                for statement in statements:
+                    session.run(statement).consume()
+            except Exception as e:
+                message = f"Schema migration {target} ({description}) failed: {e}"
+                if SCHEMA_STRICT:
+                    raise RuntimeError(message) from e
+                # Skipped, not recorded, so it is retried on the next start; later ones still run
+                print("⚠️", message, flush=True)
+                continue
+            applied.add(target)
+            session.run(
+                f"""
+                MERGE (s:{SCHEMA_LABEL})
+                SET s.applied = $applied, s.version = $version, s.applied_at = datetime()
+                """,
+                applied=sorted(applied), version=contiguous_version(applied)
+            ).consume()
+            print(f"✅ Applied schema migration {target}: {description}", flush=True)
+    return applied
+
+
+def contiguous_version(applied):
+    """Highest version with every earlier migration applied too."""
+    version = 0
+    while version + 1 in applied:
+        version += 1
+    return version
+
+
+def plan_operators(plan):
+    """Yield every operator name in an EXPLAIN plan tree."""
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        yield node["operatorType"].split("@")[0]
+        stack.extend(node.get("children", []))
+
+
+def verify_indexes(driver):
+    """EXPLAIN the hot queries and report any that fall back to a scan."""
+    problems = []
+    with driver.session() as session:
+        for name, (query, params) in HOT_QUERIES.items():
+            plan = session.run("EXPLAIN " + query, params).consume().plan
+            scans = sorted(set(plan_operators(plan)) & SCAN_OPERATORS) if plan else []
+            if scans:
+                problems.append(f"{name}: {', '.join(scans)}")
+    if problems:
+        message = "Hot queries are not using indexes: " + "; ".join(problems)
+        if SCHEMA_STRICT:
+            raise RuntimeError(message)
+        print("⚠️", message, flush=True)
+    return problems
+
+
+def bootstrap_schema(driver):
+    """Run at startup: apply pending migrations, then check hot query plans."""
+    try:
+        run_migrations(driver)
+        verify_indexes(driver)
+    except Exception as e:
+        if SCHEMA_STRICT:
+            raise
+        print("⚠️ Schema bootstrap failed:", e, flush=True)
@@ -0,0 +1,103 @@
+import os
+import queue
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+WRITE_BUFFER_SIZE = int(os.getenv("WRITE_BUFFER_SIZE", 10000))
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", 200))
+WRITE_MAX_DELAY_MS = float(os.getenv("WRITE_MAX_DELAY_MS", 10))
+
+
+class BufferFullError(Exception):
+    """Raised by submit() when the buffer is at capacity; callers should shed load."""
+
+
+class WriteBuffer:
+    """Bounded in-process queue drained by one thread that commits items in groups.
+
+    `flush(items)` writes one group, typically in a single transaction. A group is
+    flushed once it holds `batch_size` items or its oldest item has waited `max_delay_ms`.
+    """
+
+    def __init__(self, flush, max_items=WRITE_BUFFER_SIZE, batch_size=WRITE_BATCH_SIZE,
+                 max_delay_ms=WRITE_MAX_DELAY_MS):
+        self._flush = flush
+        self._queue = queue.Queue(maxsize=max_items)
+        self.batch_size = batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.flushed = 0
+        self.batches = 0
+        self.rejected = 0
+        self.failed = 0
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="notification-write-buffer", daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        if self._stopping.is_set():
+            raise BufferFullError("Write buffer is shutting down")
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.rejected += 1
+            raise BufferFullError("Write buffer is full")
+
+    def _next_batch(self, timeout):
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            self._flush(batch)
+        except Exception as e:
+            # Retry one by one so a single bad item does not lose the whole group
+            print(f"Group commit of {len(batch)} notifications failed, retrying individually:", e, flush=True)
+            for item in batch:
+                try:
+                    self._flush([item])
+                except Exception as item_error:
+                    self.failed += 1
+                    print("Dropped buffered notification:", item_error, flush=True)
+        self.flushed += len(batch)
+        self.batches += 1
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._next_batch(timeout=0.5)
+            if batch:
+                self._write(batch)
+
+    def close(self, timeout=10):
+        """Stop accepting items and write everything still queued."""
+        self._stopping.set()
+        self._thread.join(timeout)
+        while True:
+            batch = self._next_batch(timeout=0)
+            if not batch:
+                break
+            self._write(batch)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "capacity": self._queue.maxsize,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "avg_batch": round(self.flushed / self.batches, 1) if self.batches else None,
+            "rejected": self.rejected,
+            "failed": self.failed,
+        }
@@ -1,24 +1,35 @@
 from flask import Flask
 from flask_cors import CORS  
-from user_routes import user_bp 
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = Flask(__name__)  
-
 FRONTEND_URL = os.getenv("FRONTEND_URL")
 
 
-app.register_blueprint(user_bp, url_prefix="/api/user")
+def create_app():
+    # Imported here, not at module level: password hashing workers start by re-running
+    # this file, and must not build a driver or bootstrap the schema each time
+    from user_routes import user_bp, driver
+    from schema import bootstrap_schema
+
+    app = Flask(__name__)  
+
+    app.register_blueprint(user_bp, url_prefix="/api/user")
+
+    CORS(app,
+         origins=[FRONTEND_URL],
+         methods=["GET", "POST", "OPTIONS"],
+         allow_headers=["Content-Type", "Authorization"],
+         supports_credentials=True)
+
+    # 🗂️ Create constraints and indexes, then check that hot queries use them
+    bootstrap_schema(driver)
+    return app
 
-CORS(app,
-     origins=[FRONTEND_URL],
-     methods=["GET", "POST", "OPTIONS"],
-     allow_headers=["Content-Type", "Authorization"],
-     supports_credentials=True)
 
 if __name__ == "__main__":
+    app = create_app()
     port = int(os.environ.get("PORT", 5001))
     app.run(host="0.0.0.0", port=port, debug =True)
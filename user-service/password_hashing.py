@@ -0,0 +1,89 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from passlib.hash import bcrypt
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 2))
+# Calls allowed to wait for a worker; anything beyond is refused instead of queued
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", HASH_WORKERS * 4))
+HASH_TIMEOUT = float(os.getenv("HASH_TIMEOUT", 10))
+HASH_RETRY_AFTER = 2
+
+
+class PoolSaturatedError(Exception):
+    """The hashing pool is full or too slow; callers should answer 503."""
+
+
+def _hash(password, rounds):
+    return bcrypt.using(rounds=rounds).hash(password)
+
+
+def _verify(password, hashed):
+    return bcrypt.verify(password, hashed)
+
+
+# Workers must not be forked from a process that already runs request and background threads
+_mp_context = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE_SIZE)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=_mp_context)
+        return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _run(fn, *args):
+    """Run `fn` on the pool, refusing work when every worker and queue slot is taken."""
+    if not _slots.acquire(blocking=False):
+        raise PoolSaturatedError("Password hashing is busy")
+    try:
+        future = _get_executor().submit(fn, *args)
+    except BrokenProcessPool:
+        _slots.release()
+        _reset_executor()
+        raise
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=HASH_TIMEOUT)
+    except FutureTimeoutError:
+        raise PoolSaturatedError("Password hashing timed out")
+    except BrokenProcessPool:
+        _reset_executor()
+        raise
+
+
+def hash_password(password):
+    return _run(_hash, password, BCRYPT_ROUNDS)
+
+
+def verify_password(password, hashed):
+    return _run(_verify, password, hashed)
+
+
+def needs_rehash(hashed):
+    """True if `hashed` was made with a different cost than BCRYPT_ROUNDS."""
+    return bcrypt.using(rounds=BCRYPT_ROUNDS).needs_update(hashed)
@@ -1,40 +1,42 @@
 import json
 import os
-import requests
 from dotenv import load_dotenv
+from http_client import get_upstream
 
 load_dotenv()
 
 UPSTASH_REDIS_REST_URL = os.getenv("UPSTASH_REDIS_REST_URL")
 UPSTASH_REDIS_REST_TOKEN = os.getenv("UPSTASH_REDIS_REST_TOKEN")
 
+upstash = get_upstream("upstash", UPSTASH_REDIS_REST_URL)
+
 
 def store_token(token, data, expiry=600):
     try:
-        url = f"{UPSTASH_REDIS_REST_URL}/set/{token}?EX={expiry}"
+        url = f"/set/{token}?EX={expiry}"
         headers = {
             "Authorization": f"Bearer {UPSTASH_REDIS_REST_TOKEN}",
             "Content-Type": "application/json"
         }
         payload = json.dumps({"value": json.dumps(data)})
-        requests.post(url, headers=headers, data=payload)
+        upstash.post(url, headers=headers, data=payload)
     except Exception as e:
         print(f"❌ Redis HTTP store_token() failed: {e}")
 
 def verify_token(token):
     try:
-        url = f"{UPSTASH_REDIS_REST_URL}/get/{token}"
+        url = f"/get/{token}"
         headers = {
             "Authorization": f"Bearer {UPSTASH_REDIS_REST_TOKEN}"
         }
-        response = requests.get(url, headers=headers)
+        response = upstash.get(url, headers=headers)
         if response.status_code != 200:
             return None
         raw_data = response.json().get("result")
         if not raw_data:
             return None
-        del_url = f"{UPSTASH_REDIS_REST_URL}/del/{token}"
-        requests.post(del_url, headers=headers)
+        del_url = f"/del/{token}"
+        upstash.post(del_url, headers=headers)
         user = json.loads(raw_data)
         if isinstance(user, dict) and "value" in user:
             user = json.loads(user["value"])
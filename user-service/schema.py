@@ -0,0 +1,135 @@
+import os
+from dotenv import load_dotenv
+from user_routes import NODE_LABEL
+
+load_dotenv()
+
+SCHEMA_LABEL = "UserServiceSchema"
+SCHEMA_STRICT = os.getenv("SCHEMA_STRICT", "false").lower() in ("1", "true", "yes")
+
+# Applied in order; every statement must be idempotent. A failed migration does not
+# block later ones outside SCHEMA_STRICT, so each must stand on its own
+MIGRATIONS = [
+    (1, "User email/username constraints", [
+        f"CREATE CONSTRAINT userservice_email IF NOT EXISTS "
+        f"FOR (u:{NODE_LABEL}) REQUIRE u.email IS UNIQUE",
+        f"CREATE CONSTRAINT userservice_username IF NOT EXISTS "
+        f"FOR (u:{NODE_LABEL}) REQUIRE u.username IS UNIQUE",
+    ]),
+]
+
+# Queries that must be served by index seeks, checked with EXPLAIN at startup
+HOT_QUERIES = {
+    "login": (
+        f"""
+        CALL {{
+            MATCH (u:{NODE_LABEL} {{email: $identifier}}) RETURN u
+            UNION
+            MATCH (u:{NODE_LABEL} {{username: $identifier}}) RETURN u
+        }}
+        RETURN u.username, u.password, u.email
+        """,
+        {"identifier": ""},
+    ),
+    "user by email": (
+        f"MATCH (u:{NODE_LABEL} {{email: $email}}) RETURN u",
+        {"email": ""},
+    ),
+    "user by username": (
+        f"MATCH (u:{NODE_LABEL} {{username: $username}}) RETURN u",
+        {"username": ""},
+    ),
+}
+
+SCAN_OPERATORS = {
+    "AllNodesScan",
+    "NodeByLabelScan",
+    "DirectedAllRelationshipsScan",
+    "UndirectedAllRelationshipsScan",
+    "DirectedRelationshipTypeScan",
+    "UndirectedRelationshipTypeScan",
+}
+
+
+def applied_migrations(session):
+    record = session.run(
+        f"MATCH (s:{SCHEMA_LABEL}) RETURN s.version AS version, s.applied AS applied"
+    ).single()
+    if not record:
+        return set()
+    # Older schema nodes only hold the highest version, applied in order up to it
+    return set(record["applied"] or []) | set(range(1, (record["version"] or 0) + 1))
+
+
+def run_migrations(driver):
+    """Apply every pending migration and return the versions that are now applied."""
+    with driver.session() as session:
+        applied = applied_migrations(session)
+        for target, description, statements in MIGRATIONS:
+            if target in applied:
+                continue
+            try:
+                for statement in statements:
+                    session.run(statement).consume()
+            except Exception as e:
+                message = f"Schema migration {target} ({description}) failed: {e}"
+                if SCHEMA_STRICT:
+                    raise RuntimeError(message) from e
+                # Skipped, not recorded, so it is retried on the next start; later ones still run
+                print("⚠️", message, flush=True)
+                continue
+            applied.add(target)
+            session.run(
+                f"""
+                MERGE (s:{SCHEMA_LABEL})
+                SET s.applied = $applied, s.version = $version, s.applied_at = datetime()
+                """,
+                applied=sorted(applied), version=contiguous_version(applied)
+            ).consume()
+            print(f"✅ Applied schema migration {target}: {description}", flush=True)
+    return applied
+
+
+def contiguous_version(applied):
+    """Highest version with every earlier migration applied too."""
+    version = 0
+    while version + 1 in applied:
+        version += 1
+    return version
+
+
+def plan_operators(plan):
+    """Yield every operator name in an EXPLAIN plan tree."""
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        yield node["operatorType"].split("@")[0]
+        stack.extend(node.get("children", []))
+
+
+def verify_indexes(driver):
+    """EXPLAIN the hot queries and report any that fall back to a scan."""
+    problems = []
+    with driver.session() as session:
+        for name, (query, params) in HOT_QUERIES.items():
+            plan = session.run("EXPLAIN " + query, params).consume().plan
+            scans = sorted(set(plan_operators(plan)) & SCAN_OPERATORS) if plan else []
+            if scans:
+                problems.append(f"{name}: {', '.join(scans)}")
+    if problems:
+        message = "Hot queries are not using indexes: " + "; ".join(problems)
+        if SCHEMA_STRICT:
+            raise RuntimeError(message)
+        print("⚠️", message, flush=True)
+    return problems
+
+
+def bootstrap_schema(driver):
+    """Run at startup: apply pending migrations, then check hot query plans."""
+    try:
+        run_migrations(driver)
+        verify_indexes(driver)
+    except Exception as e:
+        if SCHEMA_STRICT:
+            raise
+        print("⚠️ Schema bootstrap failed:", e, flush=True)
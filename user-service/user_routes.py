@@ -1,14 +1,17 @@
-from flask import Blueprint, request, jsonify, redirect, make_response
+from flask import Blueprint, request, jsonify, redirect, make_response, g
 from redis_store import store_token, verify_token
 from email_utils import send_verification_email
 import uuid
-from passlib.hash import bcrypt
-from auth_utils import generate_token, verify_jwt_token
+from password_hashing import (
+    hash_password, verify_password, needs_rehash, PoolSaturatedError, HASH_RETRY_AFTER
+)
+from auth_utils import generate_token, verify_jwt_token, require_auth, token_cache
 from redis_store import store_token as store_reset_token
 from email_utils import send_reset_email
 import secrets
 from redis_store import verify_token as verify_reset_token
 from dotenv import load_dotenv
+from http_client import get_upstream, upstream_stats
 import os
 
 load_dotenv()
@@ -18,15 +21,25 @@ FRONTEND_URL = os.getenv("FRONTEND_URL")
 
 NODE_LABEL = "UserService"
 
+community_service = get_upstream("community", COMMUNITY_URL)
+
 user_bp = Blueprint("user", __name__)
 
 from neo4j import GraphDatabase
+from neo4j.exceptions import ConstraintError
 
 driver = GraphDatabase.driver(
     os.getenv("NEO4J_URI"),
     auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD"))
 )
 
+
+def hashing_busy():
+    """503 for when the bcrypt pool refuses work; clients retry shortly."""
+    response = jsonify({"error": "Server is busy, please try again shortly"})
+    response.headers["Retry-After"] = str(HASH_RETRY_AFTER)
+    return response, 503
+
 @user_bp.route("/register", methods=["POST"])
 def register():
     data = request.json
@@ -53,7 +66,10 @@ def register():
 
     # Continue registration
     token = str(uuid.uuid4())  # generate random token
-    hashed_password = bcrypt.hash(password)
+    try:
+        hashed_password = hash_password(password)
+    except PoolSaturatedError:
+        return hashing_busy()
     print(f"[Debug] Storing token: {token} with data: {{'username': {username}, 'email': {email}, 'password': {hashed_password}}}", flush=True)
     store_token(token, {
         "username": username,
@@ -75,17 +91,40 @@ def signin():
     if not identifier or not password:
         return jsonify({"error": "Missing credentials"}), 400
 
+    # Two unique-index seeks instead of one label scan over an OR predicate
     query = f"""
-    MATCH (u:{NODE_LABEL})
-    WHERE u.email = $identifier OR u.username = $identifier
+    CALL {{
+        MATCH (u:{NODE_LABEL} {{email: $identifier}}) RETURN u
+        UNION
+        MATCH (u:{NODE_LABEL} {{username: $identifier}}) RETURN u
+    }}
     RETURN u.username AS username, u.password AS password, u.email AS email
+    LIMIT 1
     """
 
     with driver.session() as session:
         result = session.run(query, identifier=identifier)
         user = result.single()
 
-        if user and bcrypt.verify(password, user["password"]):
+        try:
+            valid = bool(user) and verify_password(password, user["password"])
+        except PoolSaturatedError:
+            return hashing_busy()
+
+        if valid:
+            # 🔁 Upgrade hashes made with an old BCRYPT_ROUNDS while we have the plaintext
+            if needs_rehash(user["password"]):
+                try:
+                    session.run(
+                        f"""
+                        MATCH (u:{NODE_LABEL} {{email: $email}})
+                        WHERE u.password = $old_hash
+                        SET u.password = $new_hash
+                        """,
+                        email=user["email"], old_hash=user["password"], new_hash=hash_password(password)
+                    )
+                except PoolSaturatedError:
+                    pass  # Not worth failing the login; the next one will retry
             token = generate_token(user["username"],user["email"])
 
             return jsonify({
@@ -113,16 +152,9 @@ def logout():
     return jsonify({"message": "Logged out"}), 200
 
 @user_bp.route("/update-username", methods=["POST"])
+@require_auth
 def update_username():
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized"}), 401
-    token = auth_header.split(" ")[1]
-    from auth_utils import jwt, SECRET_KEY
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-    except Exception:
-        return jsonify({"error": "Invalid token"}), 401
+    payload = g.jwt_payload
     data = request.json
     new_username = data.get("username")
     if not new_username:
@@ -142,24 +174,24 @@ def update_username():
         if not user:
             return jsonify({"error": "User not found"}), 404
         # Actually update username
-        session.run(
-            f"""
-            MATCH (u:{NODE_LABEL} {{username: $current_username}})
-            SET u.username = $new_username
-            RETURN u
-            """,
-            current_username=current_username, new_username=new_username
-        )
+        try:
+            session.run(
+                f"""
+                MATCH (u:{NODE_LABEL} {{username: $current_username}})
+                SET u.username = $new_username
+                RETURN u
+                """,
+                current_username=current_username, new_username=new_username
+            ).consume()
+        except ConstraintError:
+            return jsonify({"error": "Username already taken"}), 409
         # Get user's email for community-service update
         user_email = user.get("email") if user else None
     # Notify community-service of username change
-    import requests
     try:
-        community_service_url = COMMUNITY_URL + "/api/community/user/update-username"
-        resp = requests.post(
-            community_service_url,
-            json={"email": user_email, "new_username": new_username},
-            timeout=3
+        resp = community_service.post(
+            "/api/community/user/update-username",
+            json={"email": user_email, "new_username": new_username}
         )
         print(f"Community-service response: {resp.status_code} {resp.text}")
     except Exception as e:
@@ -171,16 +203,9 @@ def update_username():
     }), 200
 
 @user_bp.route("/update-password", methods=["POST"])
+@require_auth
 def update_password():
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized"}), 401
-    token = auth_header.split(" ")[1]
-    from auth_utils import jwt, SECRET_KEY
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-    except Exception:
-        return jsonify({"error": "Invalid token"}), 401
+    payload = g.jwt_payload
     data = request.json
     current_password = data.get("current")
     new_password = data.get("new")
@@ -197,10 +222,13 @@ def update_password():
     with driver.session() as session:
         result = session.run(query, username=username)
         user = result.single()
-        if not user or not user.get("password") or not bcrypt.verify(current_password, user["password"]):
-            return jsonify({"error": "Current password incorrect"}), 401
-        # Update password
-        hashed_new = bcrypt.hash(new_password)
+        try:
+            if not user or not user.get("password") or not verify_password(current_password, user["password"]):
+                return jsonify({"error": "Current password incorrect"}), 401
+            # Update password
+            hashed_new = hash_password(new_password)
+        except PoolSaturatedError:
+            return hashing_busy()
         update_query = f"""
         MATCH (u:{NODE_LABEL} {{username: $username}})
         SET u.password = $hashed_new
@@ -214,16 +242,9 @@ def update_password():
     }), 200
 
 @user_bp.route("/me", methods=["GET"])
+@require_auth
 def get_user_info():
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized"}), 401
-    token = auth_header.split(" ")[1]
-    from auth_utils import jwt, SECRET_KEY
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-    except Exception:
-        return jsonify({"error": "Invalid token"}), 401
+    payload = g.jwt_payload
     username = payload.get("username") if payload else None
     if not username:
         return jsonify({"error": "User not found in token"}), 401
@@ -277,6 +298,11 @@ def reset_password():
     print(f"[Debug] Reset password called with token: {token}, new_password: {new_password}", flush=True)
     if not token or not new_password:
         return jsonify({'error': 'Token and new password are required'}), 400
+    # Hash before validating: validation consumes the one-time token, so a 503 here stays retryable
+    try:
+        hashed = hash_password(new_password)
+    except PoolSaturatedError:
+        return hashing_busy()
     # Validate token
     token_data = verify_reset_token(token)
     print(f"[Debug] verify_reset_token returned: {token_data}", flush=True)
@@ -284,7 +310,6 @@ def reset_password():
         return jsonify({'error': 'Invalid or expired token'}), 400
     email = token_data['email']
     # Update password in DB
-    hashed = bcrypt.hash(new_password)
     query = f"""
     MATCH (u:{NODE_LABEL} {{email: $email}})
     SET u.password = $hashed
@@ -314,3 +339,13 @@ def verify(token):
     else:
         print(f"[Debug] Missing keys in user: {user}", flush=True)
         return "❌ Invalid or expired token"
+
+
+@user_bp.route("/upstream-stats", methods=["GET"])
+def get_upstream_stats():
+    return jsonify(upstream_stats()), 200
+
+
+@user_bp.route("/cache-stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify({"token": token_cache.stats()}), 200